@@ -23,10 +23,17 @@ import os
 
 from utils.config import load_config, save_config, embed_footer, LAST_DEBUG
 from utils.generation import (
-    safe_generate, send_response, extract_image,
+    safe_generate, send_response,
     ConversationResponse, build_response,
 )
+from utils.segmenter import segment_text, DISCORD_EMBED_LIMIT
+from utils.search import search_cache
+from utils.images import extract_images, image_cache
+from utils.outbound import SEND_MODES
 from utils.memory import channel_memory, channel_summary
+from utils.admission import (
+    admission, AdmissionExpired, position_emoji, DROPPED_REACTION,
+)
 from utils.persona import (
     PERSONA_DATA, CURRENT_PERSONA, PERSONA_LOCKED, LEGACY_DETECTED,
     SetPersonaGroup,
@@ -50,6 +57,20 @@ _pending_responses: dict[int, asyncio.Task] = {}
 _autonomy_cooldown: dict[int, float]        = {}
 
 
+async def _try_react(message: discord.Message, emoji: str) -> None:
+    try:
+        await message.add_reaction(emoji)
+    except (discord.Forbidden, discord.HTTPException):
+        pass
+
+
+async def _try_unreact(message: discord.Message, emoji: str, member) -> None:
+    try:
+        await message.remove_reaction(emoji, member)
+    except (discord.Forbidden, discord.HTTPException):
+        pass
+
+
 class GenAICog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -100,14 +121,13 @@ class GenAICog(commands.Cog):
             if now - last_fire > AUTONOMY_COOLDOWN_SECONDS and random.random() < chance:
                 _autonomy_cooldown[message.channel.id] = now
                 logger.info(f"Autonomy firing in channel {message.channel.id}")
-                image_bytes, image_mime = await extract_image(message)
+                images = await extract_images(message)
                 response = await safe_generate(
                     message.content,
                     current_persona=CURRENT_PERSONA,
                     channel_id=message.channel.id,
                     username=message.author.display_name,
-                    image_bytes=image_bytes,
-                    image_mime=image_mime,
+                    images=images,
                 )
                 await send_response(response, message.channel)
                 return
@@ -123,23 +143,45 @@ class GenAICog(commands.Cog):
             _pending_responses[user_id].cancel()
             logger.debug(f"Debounce: cancelled pending task for user {user_id}")
 
+        # Admission: shed load instead of queueing without bound
+        ticket = admission.admit(user_id, message.guild.id)
+        if ticket is None:
+            await _try_react(message, DROPPED_REACTION)
+            return
+
         async def debounced_respond():
+            queued_emoji = None
             try:
                 await asyncio.sleep(DEBOUNCE_SECONDS)
-                image_bytes, image_mime = await extract_image(message_snapshot)
-                response = await safe_generate(
-                    content_snapshot or "What's in this image?",
-                    current_persona=CURRENT_PERSONA,
-                    channel_id=channel_snapshot.id,
-                    username=username_snapshot,
-                    image_bytes=image_bytes,
-                    image_mime=image_mime,
-                )
-                await send_response(response, channel_snapshot, reply_to=message_snapshot)
+                if admission.saturated():
+                    queued_emoji = position_emoji(admission.position(ticket))
+                    await _try_react(message_snapshot, queued_emoji)
+                async with admission.slot(ticket):
+                    if queued_emoji:
+                        await _try_unreact(message_snapshot, queued_emoji, self.bot.user)
+                        queued_emoji = None
+                    images = await extract_images(message_snapshot)
+                    response = await safe_generate(
+                        content_snapshot or "What's in this image?",
+                        current_persona=CURRENT_PERSONA,
+                        channel_id=channel_snapshot.id,
+                        username=username_snapshot,
+                        images=images,
+                    )
+                    await send_response(response, channel_snapshot, reply_to=message_snapshot)
+            except AdmissionExpired as e:
+                logger.info(f"Admission: dropped reply to user {user_id} ({e})")
+                if queued_emoji:
+                    await _try_unreact(message_snapshot, queued_emoji, self.bot.user)
+                await _try_react(message_snapshot, DROPPED_REACTION)
             except asyncio.CancelledError:
                 logger.debug(f"Debounce: task cancelled for user {user_id}")
+                if queued_emoji:
+                    await _try_unreact(message_snapshot, queued_emoji, self.bot.user)
             finally:
-                _pending_responses.pop(user_id, None)
+                admission.release(ticket)
+                if _pending_responses.get(user_id) is asyncio.current_task():
+                    _pending_responses.pop(user_id, None)
 
         _pending_responses[user_id] = asyncio.create_task(debounced_respond())
 
@@ -152,7 +194,7 @@ class GenAICog(commands.Cog):
             await ctx.send("AI commands are not available in DMs.")
             return
         await ctx.defer()
-        image_bytes, image_mime = await extract_image(ctx.message)
+        images = await extract_images(ctx.message)
         response = await safe_generate(
             query,
             current_persona=CURRENT_PERSONA,
@@ -163,8 +205,7 @@ class GenAICog(commands.Cog):
                 "Each idea must be separated clearly."
             ),
             apply_persona=True,
-            image_bytes=image_bytes,
-            image_mime=image_mime,
+            images=images,
         )
         embed = discord.Embed(
             title=f"{BOT_NAME} says...",
@@ -182,7 +223,7 @@ class GenAICog(commands.Cog):
         if ctx.guild is None:
             await ctx.send("AI commands are not available in DMs.")
             return
-        image_bytes, image_mime = await extract_image(ctx.message)
+        images = await extract_images(ctx.message)
         response = await safe_generate(
             query,
             current_persona=CURRENT_PERSONA,
@@ -192,8 +233,7 @@ class GenAICog(commands.Cog):
                 "Do NOT use markdown headings like ###."
             ),
             username=ctx.author.display_name,
-            image_bytes=image_bytes,
-            image_mime=image_mime,
+            images=images,
         )
         embed = discord.Embed(
             title=f"{BOT_NAME} answers...",
@@ -212,10 +252,10 @@ class GenAICog(commands.Cog):
             await ctx.send("AI commands are not available in DMs.")
             return
         await ctx.defer()
-        from utils.search import web_search
-        results  = await web_search(query)
+        from utils.search import search_context
+        results  = await search_context(query)
         response = await safe_generate(
-            f"Summarize these search results:\n\n{results}",
+            f"Summarize these search results for the query \"{query}\":\n\n{results}",
             current_persona=CURRENT_PERSONA,
             apply_persona=False,
             instruction_prefix=(
@@ -224,10 +264,10 @@ class GenAICog(commands.Cog):
                 "Keep structure readable in Discord embeds."
             )
         )
-        text = response.first_text().replace("### ", "\n\n")
+        text = "\n\n".join(s.text for s in response.segments).replace("### ", "\n\n")
         embed = discord.Embed(
             title=f"Search: {query}",
-            description=text[:4096],
+            description=segment_text(text, limit=DISCORD_EMBED_LIMIT, pack=True)[0] if text else text,
             color=discord.Color.blue()
         )
         url = f"https://www.google.com/search?q={urllib.parse.quote(query)}"
@@ -344,6 +384,25 @@ class GenAICog(commands.Cog):
         embed.add_field(name="Model",       value=MODEL_NAME, inline=True)
         embed.add_field(name="Legacy Mode", value=legacy,  inline=True)
         embed.add_field(name="Autonomy",    value=f"{autonomy_status} ({autonomy_freq})", inline=True)
+        q = admission.stats()
+        dropped = ", ".join(f"{k} {v}" for k, v in q["dropped"].items()) or "none"
+        embed.add_field(
+            name="Reply Queue",
+            value=f"{q['waiting']} waiting, {q['active']} active, {q['depth']} held • dropped: {dropped}",
+            inline=False,
+        )
+        ic = image_cache.stats()
+        embed.add_field(
+            name="Image Cache",
+            value=f"{ic['entries']} images, {ic['bytes'] / (1024 * 1024):.1f} MB • {ic['hits']} hits / {ic['misses']} misses",
+            inline=False,
+        )
+        sc = search_cache.stats()
+        embed.add_field(
+            name="Search Cache",
+            value=f"{sc['entries']} queries • {sc['hits']} hits / {sc['misses']} misses ({sc['hit_rate']:.0%})",
+            inline=False,
+        )
         embed.add_field(name="Assembled Persona",          value=f"```{p.CURRENT_PERSONA[:900]}```", inline=False)
         embed.add_field(name="Last Prompt (this channel)", value=f"```{last[:900]}```",              inline=False)
         await ctx.send(embed=embed, ephemeral=True if ctx.interaction else False)
@@ -400,6 +459,21 @@ class GenAICog(commands.Cog):
                 "Unknown action. Use `on`, `off`, or `frequency`.", ephemeral=True
             )
 
+    # -------------------------------------------------------------------
+    # /sendmode
+    # -------------------------------------------------------------------
+    @commands.hybrid_command(name='sendmode', help='Set reply pacing: natural (typing delays) or fast (Admin only).')
+    @commands.has_permissions(administrator=True)
+    async def send_mode_cmd(self, ctx, mode: str):
+        mode = mode.lower().strip()
+        if mode not in SEND_MODES:
+            await ctx.send("Mode must be `natural` or `fast`.", ephemeral=True if ctx.interaction else False)
+            return
+        config = load_config()
+        config["send_mode"] = mode
+        save_config(config)
+        await ctx.send(f"Reply pacing set to `{mode}`.", ephemeral=True if ctx.interaction else False)
+
 
 async def setup(bot):
     await bot.add_cog(GenAICog(bot))
\ No newline at end of file
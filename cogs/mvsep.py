@@ -2,10 +2,13 @@
 # YES I make mashups and I need this shut up. You may disable this cog at line 50 at main.py if you don't care about separating audio;
 # But hey it's a fun party trick and it works surprisingly well for a free API.
 
-# Current problem: no way to get progress updates or queue position; no way to cancel; links expire after some time; only one job at a time on free tier.
+# Current problem: no way to cancel; links expire after some time; only one job at a time on free tier.
 # But hey it works and it's free so I'm not complaining. My broke ass appreciates it.
+# Jobs wait in a persistent FIFO queue (utils/mvsep_queue.py) and run MVSEP_CONCURRENCY at a time; after a restart,
+# jobs MVSEP already accepted are polled again and the rest keep their place in line.
 
 import os
+import time
 import asyncio
 import logging
 import tempfile
@@ -17,7 +20,8 @@ from typing import Optional
 
 from dotenv import load_dotenv
 
-from pathlib import Path
+from utils.http_client import http_client
+from utils.mvsep_queue import SepJob, mvsep_queue
 
 load_dotenv()
 
@@ -30,7 +34,10 @@ ADD_OPT1  = 81
 OUT_FMT   = 0   # mp3 320kbps
 
 POLL_INTERVAL = 10   # seconds between status checks
-POLL_TIMEOUT  = 600  # 10 minutes max
+POLL_TIMEOUT  = 600  # 10 minutes max, counted from submission (so across restarts too)
+
+MVSEP_CONCURRENCY = int(os.getenv("MVSEP_CONCURRENCY", 1))   # jobs in flight at once: 1 on the free tier
+MVSEP_QUEUE_MAX   = int(os.getenv("MVSEP_QUEUE_MAX", 20))    # waiting + running; beyond this /separate says no
 
 # Statuses that mean the job is still running
 IN_PROGRESS = {"waiting", "processing", "distributing", "merging"}
@@ -47,8 +54,20 @@ def is_direct_audio_url(url: str) -> bool:
 
 class MVSepCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
-        self.bot   = bot
-        self._busy = False
+        self.bot    = bot
+        self._tasks: dict[int, asyncio.Task] = {}     # job id -> running job
+        self._recovery: Optional[asyncio.Task] = None
+
+    async def cog_load(self):
+        self._recovery = asyncio.create_task(self._recover())
+
+    async def cog_unload(self):
+        # Jobs stay in the queue and pick up where they left off next time the cog loads
+        if self._recovery is not None:
+            self._recovery.cancel()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        mvsep_queue.close()
 
     # ------------------------------------------------------------------
     # Submit job
@@ -92,13 +111,14 @@ class MVSepCog(commands.Cog):
     #           distributing | merging
     # ------------------------------------------------------------------
 
-    async def _poll(self, session: aiohttp.ClientSession, job_hash: str) -> dict:
+    async def _poll(self, session: aiohttp.ClientSession, job_hash: str, submitted: float,
+                    status_msg: discord.PartialMessage) -> dict:
         endpoint = f"https://mvsep.com/api/separation/get?hash={job_hash}"
-        elapsed  = 0
+        shown    = None
 
-        while elapsed < POLL_TIMEOUT:
+        # Always checks at least once: a job resumed after a long restart may well be done
+        while True:
             await asyncio.sleep(POLL_INTERVAL)
-            elapsed += POLL_INTERVAL
 
             async with session.get(endpoint) as resp:
                 payload = await resp.json()
@@ -117,60 +137,50 @@ class MVSepCog(commands.Cog):
                 raise RuntimeError("Job hash not found — it may have expired.")
 
             if status in IN_PROGRESS:
-                # Log queue position if available
+                # Log queue position if available, and show it
                 queue_pos = payload.get("data", {}).get("current_order")
                 if queue_pos:
                     logger.info(f"MVSEP job {job_hash} — status: {status}, queue position: {queue_pos}")
-                continue
-
-            # Unknown status — keep waiting
-            logger.warning(f"MVSEP unknown status: {status}")
+                text = f"⏳ MVSEP: {status}" + (f" (position {queue_pos} on their side)" if queue_pos else "") + f" • `{job_hash}`"
+                if text != shown:
+                    await self._edit(status_msg, content=text)
+                    shown = text
+            else:
+                # Unknown status — keep waiting
+                logger.warning(f"MVSEP unknown status: {status}")
 
-        raise TimeoutError("Job timed out after 10 minutes.")
+            if time.time() - submitted >= POLL_TIMEOUT:
+                raise TimeoutError("Job timed out after 10 minutes.")
 
     # ------------------------------------------------------------------
-    # Input resolver: attachment > direct URL > yt-dlp: I'm starting to think that this dosen't support direct URLs. May fix this later.
+    # Input resolver: attachment > direct URL > yt-dlp. Runs when the job's turn comes, from what was queued.
     # ------------------------------------------------------------------
 
-    async def _resolve_input(
-        self,
-        ctx,
-        source: Optional[str],
-        tmp_dir: str,
-        slash_attachment: Optional[discord.Attachment] = None,
-    ) -> tuple[Optional[str], Optional[str]]:
+    async def _resolve_input(self, job: SepJob, tmp_dir: str) -> tuple[Optional[str], Optional[str]]:
         """
         Returns (file_path, pass_url).
         file_path: local path to upload binary (or None)
         pass_url:  URL to pass directly to MVSEP (or None)
 
-        Priority:
-          1. slash_attachment (discord.Attachment from /separate)
-          2. ctx.message.attachments (prefix ~separate)
-          3. direct audio URL
-          4. yt-dlp platform URL
+        job.kind is "attachment" for a file attached to /separate or ~separate (fetched again from Discord's
+        CDN, so a job queued before a restart still has its input), otherwise "url":
+          1. direct audio URL
+          2. yt-dlp platform URL
         """
-        # 1a. Slash command attachment — discord.Attachment type hint
-        #     Per discord.py docs, discord.Attachment is the correct type
-        #     for file parameters in slash/hybrid commands (2.0+)
-        if slash_attachment is not None:
-            dest = os.path.join(tmp_dir, slash_attachment.filename)
-            await slash_attachment.save(Path(dest))
-            return dest, None
-
-        # 1b. Prefix command attachment via ctx.message
-        if ctx.message.attachments:
-            att  = ctx.message.attachments[0]
-            dest = os.path.join(tmp_dir, att.filename)
-            await att.save(dest)
+        # 1. Attachment
+        if job.kind == "attachment":
+            dest = os.path.join(tmp_dir, os.path.basename(job.filename or "audio"))
+            async with http_client.session.get(job.source) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"Couldn't fetch the attachment (HTTP {resp.status}).")
+                with open(dest, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(1024 * 1024):
+                        f.write(chunk)
             return dest, None
 
-        if not source:
-            return None, None
-
         # 2. Direct audio URL — pass straight to MVSEP
-        if is_direct_audio_url(source):
-            return None, source
+        if is_direct_audio_url(job.source):
+            return None, job.source
 
         # 3. Platform URL — yt-dlp download then upload
         from cogs.ytdlp import YtDlp
@@ -178,11 +188,124 @@ class MVSepCog(commands.Cog):
         if ytdlp_cog is None or not isinstance(ytdlp_cog, YtDlp):
             raise RuntimeError("yt-dlp cog not loaded.")
 
-        local = await ytdlp_cog.fetch_ytdlp(ctx, source, is_audio=True, tmp_dir=tmp_dir)
+        local = await ytdlp_cog.fetch_ytdlp(None, job.source, is_audio=True, tmp_dir=tmp_dir)
         if not local:
             raise RuntimeError("yt-dlp failed to download audio.")
         return local, None
 
+    # ------------------------------------------------------------------
+    # Queue: FIFO, MVSEP_CONCURRENCY jobs at a time
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def _edit(status_msg: discord.PartialMessage, **kwargs) -> None:
+        try:
+            await status_msg.edit(**kwargs)
+        except discord.HTTPException as e:
+            logger.debug(f"MVSEP status edit skipped: {e}")     # deleted message, lost access...
+
+    def _status_msg(self, job: SepJob) -> discord.PartialMessage:
+        # Edited through the channel, not the interaction, so it still works after a restart or 15 minutes
+        return self.bot.get_partial_messageable(job.channel_id).get_partial_message(job.message_id)
+
+    async def _recover(self):
+        await self.bot.wait_until_ready()
+        resumed = mvsep_queue.recover()
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} MVSEP job(s) after restart")
+        for job in resumed:
+            self._start(job)
+        await self._pump()
+
+    def _start(self, job: SepJob) -> None:
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+
+    async def _pump(self):
+        """Starts waiting jobs while there are free slots, then tells the rest where they stand."""
+        waiting = mvsep_queue.queued()
+        while waiting and len(self._tasks) < MVSEP_CONCURRENCY:
+            job = waiting.pop(0)
+            mvsep_queue.set_state(job.id, "submitting")
+            self._start(job)
+        for position, job in enumerate(waiting, 1):
+            await self._edit(self._status_msg(job), content=f"⏳ Queued for MVSEP (#{position} in line)")
+
+    async def _run(self, job: SepJob):
+        try:
+            await self._work(job, self._status_msg(job))
+        except asyncio.CancelledError:
+            # Unloading: the row stays, and the job resumes (or restarts) on the next load
+            self._tasks.pop(job.id, None)
+            raise
+        except Exception as e:
+            logger.error(f"MVSEP job {job.id} failed: {e}")
+            await self._edit(self._status_msg(job), content=f"❌ Unexpected error: {e}")
+
+        mvsep_queue.remove(job.id)
+        self._tasks.pop(job.id, None)
+        await self._pump()
+
+    async def _work(self, job: SepJob, status_msg: discord.PartialMessage):
+        session = http_client.session
+        job_hash, submitted = job.job_hash, job.submitted
+        if job_hash is None:
+            await self._edit(status_msg, content="⏳ Submitting to MVSEP...")
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                # Resolve input
+                try:
+                    file_path, pass_url = await self._resolve_input(job, tmp_dir)
+                except RuntimeError as e:
+                    await self._edit(status_msg, content=f"❌ {e}")
+                    return
+
+                if not file_path and not pass_url:
+                    await self._edit(status_msg, content="❌ No valid input found.")
+                    return
+
+                # Submit
+                try:
+                    result = await self._submit(session, file_path=file_path, url=pass_url)
+                except Exception as e:
+                    await self._edit(status_msg, content=f"❌ Submission error: {e}")
+                    return
+
+            if not result.get("success"):
+                msg = result.get("data", {}).get("message", "Unknown error.")
+                await self._edit(status_msg, content=f"❌ MVSEP rejected the job: {msg}")
+                return
+
+            job_hash = result["data"]["hash"]
+            mvsep_queue.set_submitted(job.id, job_hash)
+            submitted = time.time()
+            await self._edit(status_msg, content=f"✅ Job submitted. Polling every {POLL_INTERVAL}s... (`{job_hash}`)")
+
+        # Poll
+        try:
+            done = await self._poll(session, job_hash, submitted, status_msg)
+        except (RuntimeError, TimeoutError, aiohttp.ClientError) as e:
+            await self._edit(status_msg, content=f"❌ {e}")
+            return
+
+        # Build result embed
+        data_block = done.get("data", {})
+        files_data = data_block.get("files", [])
+        algo_desc  = data_block.get("algorithm_description", "BS Roformer ver 2025.07")
+
+        embed = discord.Embed(
+            title="Separation Complete",
+            description=f"Model: {algo_desc}",
+            color=discord.Color.green(),
+        )
+
+        for f in files_data:
+            name = f.get("name", "stem")
+            link = f.get("download_link") or f.get("link") or f.get("url", "")
+            if link:
+                embed.add_field(name=name, value=f"[Download]({link})", inline=True)
+
+        embed.set_footer(text="Links are hosted by MVSEP and expire after some time.")
+        await self._edit(status_msg, content=None, embed=embed)
+
     # ------------------------------------------------------------------
     # Actual command
     # ------------------------------------------------------------------
@@ -202,87 +325,33 @@ class MVSepCog(commands.Cog):
             await ctx.send("MVSEP API key not configured.")
             return
 
-        if self._busy:
+        # Slash attachment > prefix attachment > URL
+        attached = attachment or (ctx.message.attachments[0] if ctx.message.attachments else None)
+        if not url and not attached:
+            await ctx.send("Attach an audio file or pass a URL.")
+            return
+
+        if mvsep_queue.count() >= MVSEP_QUEUE_MAX:
             await ctx.send(
-                "⏳ A separation job is already running. "
-                "Free tier only allows one at a time — try again when it finishes.",
+                f"⏳ The separation queue is full ({MVSEP_QUEUE_MAX} jobs) — try again later.",
                 ephemeral=True if ctx.interaction else False,
             )
             return
 
-        if not url and not ctx.message.attachments and not attachment:
-            await ctx.send("Attach an audio file or pass a URL.")
-            return
-
         await ctx.defer()
-        self._busy    = True
-        status_msg    = await ctx.send("⏳ Submitting to MVSEP...")
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                with tempfile.TemporaryDirectory() as tmp_dir:
-
-                    # Resolve input
-                    try:
-                        file_path, pass_url = await self._resolve_input(ctx, url, tmp_dir, slash_attachment=attachment)
-                    except RuntimeError as e:
-                        await status_msg.edit(content=f"❌ {e}")
-                        return
-
-                    if not file_path and not pass_url:
-                        await status_msg.edit(content="❌ No valid input found.")
-                        return
-
-                    # Submit
-                    try:
-                        result = await self._submit(session, file_path=file_path, url=pass_url)
-                    except Exception as e:
-                        await status_msg.edit(content=f"❌ Submission error: {e}")
-                        return
-
-                    if not result.get("success"):
-                        msg = result.get("data", {}).get("message", "Unknown error.")
-                        await status_msg.edit(content=f"❌ MVSEP rejected the job: {msg}")
-                        return
-
-                    job_hash = result["data"]["hash"]
-                    await status_msg.edit(
-                        content=f"✅ Job submitted. Polling every {POLL_INTERVAL}s... (`{job_hash}`)"
-                    )
-
-                    # Poll
-                    try:
-                        done = await self._poll(session, job_hash)
-                    except (RuntimeError, TimeoutError) as e:
-                        await status_msg.edit(content=f"❌ {e}")
-                        return
-
-            # Build result embed
-            data_block = done.get("data", {})
-            files_data = data_block.get("files", [])
-            algo_desc  = data_block.get("algorithm_description", "BS Roformer ver 2025.07")
-
-            embed = discord.Embed(
-                title="Separation Complete",
-                description=f"Model: {algo_desc}",
-                color=discord.Color.green(),
-            )
-
-            for f in files_data:
-                name = f.get("name", "stem")
-                link = f.get("download_link") or f.get("link") or f.get("url", "")
-                if link:
-                    embed.add_field(name=name, value=f"[Download]({link})", inline=True)
-
-            embed.set_footer(text="Links are hosted by MVSEP and expire after some time.")
-            await status_msg.edit(content=None, embed=embed)
-
-        finally:
-            self._busy = False
+        status_msg = await ctx.send("⏳ Queued for MVSEP...")
+        mvsep_queue.add(
+            channel_id=status_msg.channel.id,
+            message_id=status_msg.id,
+            requester_id=ctx.author.id,
+            kind="attachment" if attached else "url",
+            source=attached.url if attached else url,
+            filename=attached.filename if attached else None,
+        )
+        await self._pump()
 
     @separate.error
     async def separate_error(self, ctx, error):
-        self._busy = False
         if isinstance(error, commands.CommandOnCooldown):
             await ctx.send(f"⏳ Wait **{error.retry_after:.1f}s**.", delete_after=10)
         else:
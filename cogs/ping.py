@@ -6,11 +6,15 @@
 # cogs/ping.py: Ping command
 
 import time
-import aiohttp
 import discord
 
 from discord.ext import commands
 
+from utils.http_client import http_client
+from utils.download_cache import download_cache
+from utils.jobs import job_queue
+from utils.processes import process_runner
+
 ROUND_LATENCY = 3
 
 
@@ -41,14 +45,13 @@ class PingCog(commands.Cog):
         try:
             start = time.perf_counter()
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get("https://discord.com/api/v10/gateway") as response:
-                    end = time.perf_counter()
+            async with http_client.session.get("https://discord.com/api/v10/gateway") as response:
+                end = time.perf_counter()
 
-                    if response.status == 200:
-                        api_status = f"Online ({(end - start) * 1000:.{ROUND_LATENCY}f} ms)"
-                    else:
-                        api_status = f"HTTP {response.status}"
+                if response.status == 200:
+                    api_status = f"Online ({(end - start) * 1000:.{ROUND_LATENCY}f} ms)"
+                else:
+                    api_status = f"HTTP {response.status}"
 
         except Exception as e:
             api_status = f"Error: {type(e).__name__}"
@@ -76,6 +79,48 @@ class PingCog(commands.Cog):
             inline=False
         )
 
+        upstreams = "\n".join(
+            f"`{host}` {s.avg_ms:.0f} ms avg • {s.requests} req • {s.errors} err"
+            for host, s in sorted(http_client.upstreams.items())
+        )
+        if upstreams:
+            embed.add_field(
+                name="Upstreams",
+                value=upstreams[:1024],
+                inline=False
+            )
+
+        cache = download_cache.stats()
+        embed.add_field(
+            name="Download Cache",
+            value=(
+                f"{cache['entries']} files • {cache['bytes'] / (1024 * 1024):.0f}/{download_cache.max_bytes // (1024 * 1024)} MB • "
+                f"{cache['hit_rate']:.0%} hit rate"
+            ),
+            inline=False
+        )
+
+        jobs = job_queue.stats()
+        embed.add_field(
+            name="Download Queue",
+            value=(
+                f"Download {jobs['download']['active']}/{jobs['download']['workers']} ({jobs['download']['queued']} queued) • "
+                f"Transcode {jobs['transcode']['active']}/{jobs['transcode']['workers']} ({jobs['transcode']['queued']} queued) • "
+                f"{jobs['attached']} joined"
+            ),
+            inline=False
+        )
+
+        procs = process_runner.stats()
+        embed.add_field(
+            name="Media Processes",
+            value=(
+                f"{procs['running']} running • {procs['runs']} run • {procs['failed']} failed "
+                f"({procs['timeouts']} timed out) • {procs['cpu_seconds']:.0f}s CPU"
+            ),
+            inline=False
+        )
+
         embed.set_footer(text=f"Requested by {ctx.author}")
 
         await ctx.send(embed=embed)
@@ -1,71 +1,100 @@
 # cogs/wolfram.py: Wolfram Alpha query solution
 
+import io
 import os
+import time
+import asyncio
 import aiohttp
 import logging
 import re
 import discord
 from discord.ext import commands
 from discord import app_commands
-from urllib.parse import quote
+from utils.http_client import http_client, UpstreamStats
+from utils.wolfram_cache import wolfram_cache
+from utils.wolfram_format import format_wolfram_text
+from utils.local_math import evaluate as evaluate_locally
+from utils.latex import render_math, warm_renderer, shutdown_renderer
 
 WOLFRAM_SHORT_APPID = os.getenv("WOLFRAM_APPID_SHORT")
 WOLFRAM_LLM_APPID = os.getenv("WOLFRAM_APPID_LLM")
+WOLFRAM_TIMEOUT = aiohttp.ClientTimeout(total=20)
+SHORT_PREFERENCE_MS = int(os.getenv("WOLFRAM_SHORT_PREFERENCE_MS", 800))
+
+
+# Batch mode: several queries in one /math, separated by ";" or newlines
+BATCH_SEPARATOR_RE = re.compile(r"[;\n]")
+BATCH_MAX_QUERIES  = 8
+BATCH_CONCURRENCY  = 4
+EMBED_TEXT_BUDGET  = 5800   # Discord rejects embeds over 6000 characters in total; keeps a margin
+
+SOURCE_LABELS = {
+    "local": "Local evaluator",
+    "short": "Wolfram|Alpha Short Answers",
+    "llm":   "Wolfram|Alpha LLM API",
+}
+
+
+def split_batch(query: str) -> list[str]:
+    return [q.strip() for q in BATCH_SEPARATOR_RE.split(query) if q.strip()]
+
+
+def fit_fields(fields: list[tuple[str, str]], budget: int) -> list[tuple[str, str]]:
+    """Shortens field values so names plus values fit `budget` characters. Short answers stay whole; the
+    longest ones share what's left evenly and are cut with an ellipsis."""
+    remaining = budget - sum(len(name) for name, _ in fields)
+    if sum(len(value) for _, value in fields) <= remaining:
+        return fields
+    sizes = {}
+    order = sorted(range(len(fields)), key=lambda i: len(fields[i][1]))
+    for n, i in enumerate(order):
+        sizes[i] = min(len(fields[i][1]), max(remaining // (len(order) - n), 1))
+        remaining -= sizes[i]
+    return [
+        (name, value if sizes[i] >= len(value) else value[:sizes[i] - 1] + "…")
+        for i, (name, value) in enumerate(fields)
+    ]
+
+
+def is_good_short(result: str | None) -> bool:
+    return bool(result) and "did not understand" not in result.lower()
+
 
 # Formatting function
 class WolframCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.api_stats: dict[str, UpstreamStats] = {}
+        wolfram_cache.purge_expired()
 
-    def format_wolfram_text(self, text: str) -> str:
-        if not text:
-            return "No result found."
+    async def cog_load(self):
+        self._warmup = asyncio.create_task(warm_renderer())
 
-        # 1. Strip absolute noise
-        text = re.sub(r'(?i)Wolfram Language code:.*', '', text)
-        text = re.sub(r'(?i)Wolfram\s*\|\s*Alpha website result.*', '', text)
-        
-        # 2. Focus on core content
-        if "Input interpretation" in text:
-            text = text[text.find("Input interpretation"):]
+    async def cog_unload(self):
+        wolfram_cache.close()
+        shutdown_renderer()
 
-        # 3. Improved Result Capture
-        text = re.sub(r'(?i)Result:\s*\n*(.+)', r'**Result:** `\1`', text)
-        
-        # 4. Clean up metadata URLs but keep text
-        text = re.sub(r'(?i)(plot|image|url):\s*https?://\S+', '', text)
-        text = re.sub(r'https?://\S+', '', text)
-        
-        # 5. Bold table headers
-        text = re.sub(r'(?m)^([^:\n|]+)\s*\|\s*([^\n]+)', r'**\1** | \2', text)
-        
-        # 6. Collapse gaps
-        text = re.sub(r'\n\s*\n', '\n', text)
-        
-        return text.strip()
-
-    def create_embed(self, title: str, content: str, query: str) -> discord.Embed:
-        formatted_content = self.format_wolfram_text(content)
-        
+    def create_embed(self, title: str, formatted_content: str, query: str, source: str = "", cached: bool = False) -> discord.Embed:
         embed = discord.Embed(
             title=title,
             description=formatted_content[:4096],
             color=0xDA5B40 
         )
 
-        # identify math for LaTeX image rendering
-        math_match = re.search(r'\*\*Result:\*\*\s*`([^`]+)`', formatted_content)
-        if math_match:
-            raw_math = math_match.group(1)
-            if any(char in raw_math for char in '0123456789=+-*/^()√π∫'):
-                latex_math = raw_math.replace('≈', r'\approx').replace('integral', r'\int')
-                encoded_math = quote(latex_math)
-                latex_url = fr"https://latex.codecogs.com/png.image?\dpi{{150}}\bg{{white}}{encoded_math}"
-                embed.set_image(url=latex_url)
-
-        embed.set_footer(text=f"Query: {query}")
+        footer = f"Query: {query}"
+        if source:
+            footer += f"  •  {SOURCE_LABELS.get(source, source)}{' (cached)' if cached else ''}"
+        embed.set_footer(text=footer)
         return embed
 
+    # identify math for image rendering
+    async def render_result(self, raw_math: str | None) -> bytes | None:
+        if not raw_math:
+            return None
+        if not any(char in raw_math for char in '0123456789=+-*/^()√π∫'):
+            return None
+        return await render_math(raw_math)
+
     # Math command
     @commands.hybrid_command(name="math", aliases=['wa', 'wolfram', 'mq'], help="Answers math queries using Wolfram Alpha.")
     @app_commands.describe(query="The math problem or question you want to solve.")
@@ -74,27 +103,130 @@ class WolframCog(commands.Cog):
         await ctx.defer()
         
         logging.info(f"Processing query: {query}")
-        
-        # Try short answer API first
-        short_result = await self.query_short_answer(query)
-        
-        if short_result and "did not understand" not in short_result.lower():
-            logging.info(f"Short API succeeded")
-            embed = self.create_embed("Wolfram Alpha Result", short_result, query)
-            await ctx.send(embed=embed)
+
+        queries = split_batch(query)
+        if len(queries) > 1:
+            await self.solve_batch(ctx, queries)
             return
-        
-        # If short answer fails, try full LLM API
-        full_result = await self.query_llm_api(query)
-        
-        if full_result:
-            logging.info(f"Full API succeeded")
-            embed = self.create_embed("Wolfram Alpha Result", full_result, query)
-            await ctx.send(embed=embed)
+
+        answer = await self.solve(query)
+
+        if answer:
+            formatted, expr, source, cached = answer
+            title = "Result" if source == "local" else "Wolfram Alpha Result"
+            embed = self.create_embed(title, formatted, query, source, cached)
+            png = await self.render_result(expr)
+            if png:
+                embed.set_image(url="attachment://result.png")
+                await ctx.send(embed=embed, file=discord.File(io.BytesIO(png), filename="result.png"))
+            else:
+                await ctx.send(embed=embed)
         else:
             logging.warning("Both APIs failed")
             await ctx.send("Sorry, I couldn't find an answer to your query.")
 
+    # All queries run concurrently (bounded), duplicates are solved once, and the answers share one embed
+    async def solve_batch(self, ctx, queries: list[str]):
+        dropped = len(queries) - BATCH_MAX_QUERIES
+        queries = queries[:BATCH_MAX_QUERIES]
+        slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+        unique: dict[str, asyncio.Task] = {}
+
+        async def bounded(q: str):
+            async with slots:
+                return await self.solve(q)
+
+        for q in queries:
+            key = wolfram_cache.key(q)
+            if key not in unique:
+                unique[key] = asyncio.create_task(bounded(q))
+        await asyncio.gather(*unique.values())
+
+        embed = discord.Embed(title="Wolfram Alpha Results", color=0xDA5B40)
+        sources = set()
+        fields = []
+        for q in queries:
+            answer = unique[wolfram_cache.key(q)].result()
+            if answer:
+                formatted, _, source, cached = answer
+                sources.add(SOURCE_LABELS.get(source, source))
+                value = formatted[:1024]
+            else:
+                value = "Sorry, I couldn't find an answer to this one."
+            fields.append((q[:256], value or "No result found."))
+
+        footer = f"{len(queries)} queries"
+        if dropped > 0:
+            footer += f" ({dropped} more skipped, max {BATCH_MAX_QUERIES})"
+        if sources:
+            footer += f"  •  {', '.join(sorted(sources))}"
+        embed.set_footer(text=footer)
+        for name, value in fit_fields(fields, EMBED_TEXT_BUDGET - len(embed.title) - len(footer)):
+            embed.add_field(name=name, value=value, inline=False)
+        await ctx.send(embed=embed)
+
+    # Local evaluator first, then the cache, then the APIs. Returns (formatted_text, result_expr, source, cached) or None.
+    async def solve(self, query: str) -> tuple[str, str | None, str, bool] | None:
+        local = evaluate_locally(query)
+        if local is not None:
+            logging.info("Answered locally")
+            return f"**Result:** `{local}`", local, "local", False
+
+        cached = wolfram_cache.get(query)
+        if cached:
+            logging.info("Wolfram cache hit")
+            return (*cached, True)
+
+        answer = await self.race_apis(query)
+        if not answer:
+            return None
+        source, result = answer
+        logging.info(f"{source} API succeeded")
+        formatted, expr = format_wolfram_text(result)
+        wolfram_cache.put(query, formatted, expr, source)
+        return formatted, expr, source, False
+
+    # Both APIs are queried at once. The short answer wins if it arrives within SHORT_PREFERENCE_MS,
+    # otherwise the first good answer does; the other request is cancelled.
+    async def race_apis(self, query: str) -> tuple[str, str] | None:
+        short_task = asyncio.create_task(self._timed("short", self.query_short_answer(query)))
+        llm_task   = asyncio.create_task(self._timed("llm", self.query_llm_api(query)))
+        names = {short_task: "short", llm_task: "llm"}
+        try:
+            await asyncio.wait({short_task}, timeout=SHORT_PREFERENCE_MS / 1000)
+            if short_task.done():
+                if is_good_short(short_task.result()):
+                    return "short", short_task.result()
+                pending = {llm_task}
+            else:
+                pending = {short_task, llm_task}
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # If both land together, the short answer keeps its preference
+                for task in sorted(done, key=lambda t: t is not short_task):
+                    result = task.result()
+                    if is_good_short(result) if task is short_task else result:
+                        return names[task], result
+            return None
+        finally:
+            for task in names:
+                if not task.done():
+                    task.cancel()
+
+    async def _timed(self, api: str, coro) -> str | None:
+        start = time.perf_counter()
+        result = await coro  # cancellation of the losing request propagates without being recorded
+        stats = self.api_stats.setdefault(api, UpstreamStats())
+        elapsed = (time.perf_counter() - start) * 1000
+        stats.requests += 1
+        stats.total_ms += elapsed
+        stats.last_ms   = elapsed
+        if result is None:
+            stats.errors += 1
+        logging.info(f"Wolfram {api} API: {elapsed:.0f} ms (avg {stats.avg_ms:.0f} ms)")
+        return result
+
     async def query_short_answer(self, query: str) -> str | None:
         if not WOLFRAM_SHORT_APPID:
             return None
@@ -103,11 +235,10 @@ class WolframCog(commands.Cog):
         params = {"appid": WOLFRAM_SHORT_APPID, "i": query, "units": "metric"}
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as resp:
-                    if resp.status == 200:
-                        return await resp.text()
-                    return None
+            async with http_client.session.get(url, params=params, timeout=WOLFRAM_TIMEOUT) as resp:
+                if resp.status == 200:
+                    return await resp.text()
+                return None
         except Exception as e:
             logging.error(f"Error in short answer: {e}")
             return None
@@ -120,15 +251,14 @@ class WolframCog(commands.Cog):
         params = {"appid": WOLFRAM_LLM_APPID, "input": query, "units": "metric"}
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as resp:
-                    if resp.status == 200:
-                        content_type = resp.headers.get('content-type', '').lower()
-                        if 'application/json' in content_type:
-                            data = await resp.json()
-                            return str(data.get("result"))
-                        return await resp.text()
-                    return None
+            async with http_client.session.get(url, params=params, timeout=WOLFRAM_TIMEOUT) as resp:
+                if resp.status == 200:
+                    content_type = resp.headers.get('content-type', '').lower()
+                    if 'application/json' in content_type:
+                        data = await resp.json()
+                        return str(data.get("result"))
+                    return await resp.text()
+                return None
         except Exception as e:
             logging.error(f"Error in LLM API: {e}")
             return None
@@ -1,12 +1,22 @@
 # cogs/ytdlp.py: yt-dlp video downloader
 
 import asyncio
+import logging
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import os
 import tempfile
 import time
+from yt_dlp.utils import sanitize_filename
+from utils.media import BATCH_MAX_ITEMS, SIZE_HEADROOM, MediaRejected, PlaylistFound, probe, select_audio, select_video, download, stream_download, stream_meta
+from utils.download_cache import download_cache
+from utils.jobs import Job, job_queue, follow, follow_many
+from utils.transcode import probe_media, plan_encode, plan_transcode, run_transcode
+from utils.file_share import file_share, write_bundle
+from utils.processes import process_runner
+
+MAX_ATTACHMENTS = 10    # per Discord message
 
 # Auto-redirect all music.youtube.com links to www.youtube.com: not needed but harmless
 def normalize_url(url: str) -> str:
@@ -17,152 +27,254 @@ def normalize_url(url: str) -> str:
 class YtDlp(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.limit = 10 * 1024 * 1024  # Set to 10MB Discord Limit
-
-    async def compress_video(self, input_path: str, target_size_mb: float = 9.5) -> str | None:
-        """Forces the video to fit under the target size using FFmpeg."""
-        output_path = input_path.replace(".mp4", "_fixed.mp4")
-        
-        # Get video duration for bitrate calculation
-        duration_cmd = [
-            "ffprobe", "-v", "error", "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1", input_path
-        ]
-        proc = await asyncio.create_subprocess_exec(
-            *duration_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        stdout, _ = await proc.communicate()
-        
-        try:
-            duration = float(stdout.decode().strip())
-        except (ValueError, TypeError):
+        self.limit = 10 * 1024 * 1024  # Default 10MB Discord limit; upload_limit() knows the real one
+        self.share_janitor.start()
+
+    async def cog_unload(self):
+        self.share_janitor.cancel()
+        process_runner.kill_all()
+
+    @tasks.loop(minutes=10)
+    async def share_janitor(self):
+        await asyncio.to_thread(file_share.sweep)
+
+    async def compress_video(self, input_path: str, target_size_mb: float | None = None, on_progress=None) -> str | None:
+        """Fits the video under the target size (default: just under self.limit): remux, two-pass or capped-CRF
+        encode, as planned from its bitrate budget."""
+        target_size_mb = target_size_mb or self.limit * SIZE_HEADROOM / (1024 * 1024)
+        meta = await probe_media(input_path)
+        if meta is None:
             return None
+        plan = plan_transcode(meta, int(target_size_mb * 1024 * 1024))
+        if plan is None:
+            return None    # the bitrate budget is too low for a watchable result
 
-        # Calculate target bitrate to fit within size limit
-        target_total_bitrate = (target_size_mb * 8 * 1024 * 1024) / duration
-        video_bitrate = int(target_total_bitrate - 128000)
+        logging.info(f"Transcode plan for {os.path.basename(input_path)}: {plan.describe()}")
+        output_path = os.path.splitext(input_path)[0] + "_fixed.mp4"
+        return await run_transcode(plan, meta, input_path, output_path, on_progress=on_progress)
 
-        # If bitrate is too low, compression won't produce a watchable result
-        if video_bitrate < 100000:
+    async def _produce(self, job: Job, url: str, is_audio: bool, limit: int | None) -> str | None:
+        """The job body: probes once, picks the format that fits `limit` and downloads it once, or returns the
+        cached file. Downloading and compressing each wait for a worker slot. Raises MediaRejected up front for
+        media that can't be delivered."""
+        # Audio depends on the limit too (native stream if it fits, otherwise an MP3 sized to it)
+        mode = "audio" if is_audio else "video"
+        target = limit
+        cached = download_cache.lookup_url(url, mode, target)
+        if cached:
+            logging.info(f"Download cache hit for {url}")
+            return cached
+
+        job.set_stage("probing")
+        info = await probe(url)
+        if info is None:
             return None
 
-        compress_cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-b:v", str(video_bitrate), "-maxrate", str(video_bitrate), "-bufsize", str(video_bitrate * 2),
-            "-vcodec", "libx264", "-preset", "veryfast", "-acodec", "aac", "-b:a", "128k",
-            output_path
-        ]
-        
-        proc = await asyncio.create_subprocess_exec(*compress_cmd)
-        await proc.wait()
-        
-        return output_path if os.path.exists(output_path) else None
-
-    async def fetch_ytdlp(self, ctx, url: str, is_audio: bool, tmp_dir: str) -> str | None:
-        ext = "mp3" if is_audio else "mp4"
-
-        # Audio download path — extract and convert to mp3
-        if is_audio:
-            output_path = os.path.join(tmp_dir, f"%(uploader)s – %(title)s.{ext}")
-            cmd = ["yt-dlp", "-x", "--audio-format", "mp3", "--audio-quality", "5", "-o", output_path, "--no-playlist", url]
-            proc = await asyncio.create_subprocess_exec(*cmd)
-            await proc.wait()
-            files = os.listdir(tmp_dir)
-            return os.path.join(tmp_dir, files[0]) if files else None
-
-        # Video download path — try resolutions from highest to lowest
-        for height in [1080, 720, 480]:
-            # Clear temp dir before each attempt to avoid picking up leftover files
-            for f in os.listdir(tmp_dir):
-                try:
-                    os.remove(os.path.join(tmp_dir, f))
-                except:
-                    pass
-
-            output_path = os.path.join(tmp_dir, f"%(uploader)s – %(title)s.{ext}")
-            cmd = [
-                "yt-dlp",
-                # Primary: best video + best audio at target height, merged to mp4
-                # Fallback 1: any video+audio at target height
-                # Fallback 2: best single-file format at target height
-                "-f", f"bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<={height}]+bestaudio/best[height<={height}]",
-                "--merge-output-format", "mp4",
-                "--audio-multistreams",                        # Allow multiple audio streams during merge
-                "--postprocessor-args", "ffmpeg:-c:a aac",    # Re-encode audio to AAC to ensure compatibility
-                "-o", output_path,
-                "--no-playlist",
-                url
-            ]
-            proc = await asyncio.create_subprocess_exec(*cmd)
-            await proc.wait()
-
-            files = os.listdir(tmp_dir)
-            if not files:
-                continue  # yt-dlp produced nothing, try next resolution
-
-            path = os.path.join(tmp_dir, files[0])
-
-            # Verify the file actually contains an audio stream
-            # Silent merge failures can produce video-only files without erroring
-            probe_cmd = [
-                "ffprobe", "-v", "error",
-                "-select_streams", "a",
-                "-show_entries", "stream=codec_type",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                path
-            ]
-            probe = await asyncio.create_subprocess_exec(
-                *probe_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            stdout, _ = await probe.communicate()
+        key = download_cache.key(info, mode, target)
+        async with download_cache.lock(key):
+            cached = download_cache.get(key)
+            if cached is None:
+                choice = select_audio(info, limit) if is_audio else select_video(info, limit)
+                quality = f"MP3 {choice.mp3_bitrate // 1000}k" if choice.mp3_bitrate else f"{choice.height or '?'}p"
+                logging.info(f"yt-dlp format {choice.spec} ({quality}, ~{(choice.est_bytes or 0) / 1e6:.1f}MB) for {url}")
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    path = await self._download_fitted(job, info, choice, tmp_dir, is_audio, limit)
+                    if not path:
+                        return None
+                    job.set_stage("finishing")
+                    cached = download_cache.put(key, path)
+            download_cache.remember(url, mode, target, key)
+        return cached
 
-            if not stdout.decode().strip():
-                # No audio stream detected — skip this file and try next resolution
-                continue
+    async def _download_fitted(self, job: Job, info: dict, choice, tmp_dir: str, is_audio: bool, limit: int | None) -> str | None:
+        """Downloads `choice` into `tmp_dir` and makes it fit `limit`, holding the worker slots each step needs."""
+        target_mb = limit * SIZE_HEADROOM / (1024 * 1024) if limit is not None else None
 
-            # File has audio — check size
-            if os.path.getsize(path) <= self.limit:
-                return path
-            elif height == 480:
-                # At lowest resolution and still too large — attempt compression
-                return await self.compress_video(path)
+        # Known up front to need compression and long enough for a single-pass encode anyway: pipe yt-dlp into
+        # ffmpeg so the full-size download never hits the disk
+        if not is_audio and choice.compress and limit is not None:
+            meta = stream_meta(info, choice)
+            plan = plan_encode(meta, int(target_mb * 1024 * 1024)) if meta else None
+            if plan is not None and plan.mode == "crf":
+                logging.info(f"Streaming transcode plan: {plan.describe()}")
+                async with job_queue.slot(job, "download"), job_queue.slot(job, "transcode"):
+                    job.set_stage("transcoding")
+                    return await stream_download(info, choice, tmp_dir, plan, meta, on_progress=job.set_progress)
 
-        return None
+        async with job_queue.slot(job, "download"):
+            job.set_stage("downloading")
+            path = await download(info, choice, tmp_dir, audio=is_audio, on_progress=job.set_progress)
+        if not path:
+            return None
+
+        # Estimates can be off (or missing); compression is the fallback for video that still doesn't fit.
+        # Single-file formats can also arrive in other containers, which only need a remux to mp4.
+        if not is_audio and limit is not None and (os.path.getsize(path) > limit or not path.endswith(".mp4")):
+            async with job_queue.slot(job, "transcode"):
+                job.set_stage("transcoding")
+                path = await self.compress_video(path, target_mb, on_progress=job.set_progress)
+        return path
+
+    def upload_limit(self, ctx) -> int:
+        """Bytes the reply can carry: the interaction's own limit for slash commands (covers boosts and user
+        installs), otherwise the guild's boost tier, otherwise the default."""
+        if ctx.interaction is not None:
+            return ctx.interaction.filesize_limit
+        if ctx.guild is not None:
+            return ctx.guild.filesize_limit
+        return self.limit
+
+    def channel_message(self, message: discord.Message) -> discord.PartialMessage:
+        """`message`, edited through its channel rather than the interaction: a slash command's token expires
+        after 15 minutes, which a queued or long job can easily outlast."""
+        return self.bot.get_partial_messageable(message.channel.id).get_partial_message(message.id)
+
+    def fetch(self, url: str, is_audio: bool, limit: int | None = None) -> Job:
+        """Queues a download, or joins the one already running for the same URL and target."""
+        mode = "audio" if is_audio else "video"
+        key = f"{mode}|{limit}|{url}"
+        return job_queue.submit(key, lambda job: self._produce(job, url, is_audio, limit))
+
+    async def fetch_ytdlp(self, ctx, url: str, is_audio: bool, tmp_dir: str | None = None, limit: int | None = None) -> str | None:
+        """Downloads through the job queue and returns the cached file (used by /separate). `tmp_dir` is unused:
+        jobs are shared between requesters, so each one stages in its own directory. A playlist gives its first entry."""
+        try:
+            return await self.fetch(url, is_audio, limit).wait()
+        except PlaylistFound as e:
+            return await self.fetch(e.urls[0], is_audio, limit).wait()
 
     async def handle_download(self, ctx, url: str, is_audio: bool):
-        url = normalize_url(url)
+        urls = list(dict.fromkeys(normalize_url(u) for u in url.split()))
         start_time = time.perf_counter()
         kind = "Audio" if is_audio else "Video"
 
-        async with ctx.typing():
-            with tempfile.TemporaryDirectory() as tmp_dir:
-                local_path = await self.fetch_ytdlp(ctx, url, is_audio, tmp_dir)
+        # Every size decision (format, whether and how hard to compress, the final check) follows this limit.
+        # With links available, oversized media is kept as downloaded instead of compressed down to it.
+        limit = self.upload_limit(ctx)
+        fetch_limit = max(file_share.max_bytes, limit) if file_share.enabled else limit
 
-                if not local_path or not os.path.exists(local_path):
-                    return await ctx.send(f"❌ **{kind} failed.** Content is unavailable or too large.")
+        if len(urls) > 1:
+            status = self.channel_message(await ctx.send(f"⏳ **{kind} batch** • {len(urls)} links"))
+            return await self.handle_batch(status, urls, is_audio, limit, fetch_limit)
 
-                elapsed = time.perf_counter() - start_time
-                size_mb = os.path.getsize(local_path) / (1024 * 1024)
+        job = self.fetch(urls[0], is_audio, limit=fetch_limit)
+        status = self.channel_message(await ctx.send(f"⏳ **{kind}** • {job.status()}"))
+        try:
+            local_path = await follow(job, status, kind)
+        except MediaRejected as e:
+            return await status.edit(content=f"❌ **{kind} failed.** {e}")
+        except PlaylistFound as e:
+            return await self.handle_batch(status, e.urls, is_audio, limit, fetch_limit, title=e.title)
+
+        if not local_path or not os.path.exists(local_path):
+            return await status.edit(content=f"❌ **{kind} failed.** Content is unavailable or too large.")
+
+        elapsed = time.perf_counter() - start_time
+        size = os.path.getsize(local_path)
+        size_mb = size / (1024 * 1024)
+
+        if size > limit:
+            if not file_share.enabled:
+                return await status.edit(content=f"⚠️ **{kind} ({size_mb:.1f}MB) exceeds the {limit // (1024 * 1024)}MB limit.**")
+            link, expires = await asyncio.to_thread(file_share.publish, local_path)
+            return await status.edit(
+                content=f"✅ **{kind} Downloaded** • {elapsed:.2f}s • {size_mb:.1f}MB, too big to upload\n"
+                        f"🔗 <{link}> (expires <t:{expires}:R>)"
+            )
+
+        await status.edit(
+            content=f"✅ **{kind} Downloaded** • {elapsed:.2f}s",
+            attachments=[discord.File(local_path)]
+        )
 
-                if size_mb > 10.2:
-                    return await ctx.send(f"⚠️ **{kind} ({size_mb:.1f}MB) exceeds limit.**")
+    async def handle_batch(self, status: discord.PartialMessage, urls: list[str], is_audio: bool, limit: int, fetch_limit: int, title: str | None = None):
+        """Fetches several links (or a playlist's entries) concurrently through the job queue, reports them in one
+        status message and delivers them together: attachments, a zip, a link, or as many messages as it takes."""
+        start_time = time.perf_counter()
+        kind = "Audio" if is_audio else "Video"
+        label = f"{kind} batch" + (f" • {title[:80]}" if title else "")
+
+        results: dict[str, object] = {}
+        pending = urls[:BATCH_MAX_ITEMS]
+        skipped = len(urls) - len(pending)
+        seen = set(urls)
+        while pending:
+            jobs = [self.fetch(u, is_audio, limit=fetch_limit) for u in pending]
+            outcomes = await follow_many(jobs, status, label, pending)
+            playlists = []
+            for u, outcome in zip(pending, outcomes):
+                if isinstance(outcome, PlaylistFound):
+                    playlists.append(outcome)
+                else:
+                    results[u] = outcome
+            # Playlists among the links are expanded once, within the same item budget
+            pending = []
+            for playlist in playlists:
+                room = BATCH_MAX_ITEMS - len(results) - len(pending)
+                fresh = [u for u in playlist.urls if u not in seen]
+                seen.update(fresh)
+                pending += fresh[:max(room, 0)]
+                skipped += max(len(fresh) - max(room, 0), 0)
+
+        files, failed = [], []
+        for u, outcome in results.items():
+            if isinstance(outcome, str) and os.path.exists(outcome) and (file_share.enabled or os.path.getsize(outcome) <= limit):
+                files.append(outcome)
+            else:
+                if isinstance(outcome, BaseException) and not isinstance(outcome, MediaRejected):
+                    logging.warning(f"Batch item {u} failed: {outcome!r}")
+                failed.append(u)
+
+        elapsed = time.perf_counter() - start_time
+        notes = ""
+        if failed:
+            notes += "\n⚠️ Failed: " + ", ".join(f"<{u}>" for u in failed[:5]) + (f" and {len(failed) - 5} more" if len(failed) > 5 else "")
+        if skipped:
+            notes += f"\n⚠️ {skipped} more skipped (limit is {BATCH_MAX_ITEMS} per command)"
+        if not files:
+            return await status.edit(content=f"❌ **{label} failed.**{notes}")
+
+        summary = f"✅ **{label}** • {len(files)}/{len(results)} downloaded • {elapsed:.2f}s{notes}"
+        total = sum(os.path.getsize(p) for p in files)
+        bundle_name = sanitize_filename(title or f"{kind.lower()}-batch")
+
+        if total <= limit and len(files) <= MAX_ATTACHMENTS:
+            return await status.edit(content=summary, attachments=[discord.File(p) for p in files])
+        if total <= limit:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                bundle = os.path.join(tmp_dir, f"{bundle_name}.zip")
+                await asyncio.to_thread(write_bundle, files, bundle)
+                return await status.edit(content=summary, attachments=[discord.File(bundle)])
+        if file_share.enabled:
+            link, expires = await asyncio.to_thread(file_share.publish_bundle, files, bundle_name)
+            return await status.edit(content=f"{summary}\n🔗 <{link}> ({total / (1024 * 1024):.1f}MB zip, expires <t:{expires}:R>)")
 
-                await ctx.send(
-                    content=f"✅ **{kind} Downloaded** • {elapsed:.2f}s",
-                    file=discord.File(local_path)
-                )
+        # No links: as few messages as the upload limit allows
+        groups: list[list[str]] = [[]]
+        used = 0
+        for path in files:
+            size = os.path.getsize(path)
+            if groups[-1] and (used + size > limit or len(groups[-1]) == MAX_ATTACHMENTS):
+                groups.append([])
+                used = 0
+            groups[-1].append(path)
+            used += size
+        await status.edit(content=summary, attachments=[discord.File(p) for p in groups[0]])
+        for group in groups[1:]:
+            await status.channel.send(files=[discord.File(p) for p in group])
 
     # Download command
     @commands.hybrid_command(name="download", aliases=["dl"], description="Download a video (1080p/720p/480p/Compressed)", help="Download a video (1080p/720p/480p/Compressed)")
+    @app_commands.describe(url=f"A link, several links separated by spaces, or a playlist (up to {BATCH_MAX_ITEMS} items)")
     @commands.cooldown(1, 30, commands.BucketType.user)
-    async def download_video(self, ctx, url: str):
+    async def download_video(self, ctx, *, url: str):
         await self.handle_download(ctx, url, is_audio=False)
 
     # Audio download command
-    @commands.hybrid_command(name="audio", aliases=["mp3"], description="Download video as an MP3", help="Download video as an MP3")
-    @app_commands.describe(url="The URL of the audio to download")
+    @commands.hybrid_command(name="audio", aliases=["mp3"], description="Download the audio (original stream when it fits, MP3 otherwise)", help="Download the audio (original stream when it fits, MP3 otherwise)")
+    @app_commands.describe(url=f"A link, several links separated by spaces, or a playlist (up to {BATCH_MAX_ITEMS} items)")
     @commands.cooldown(1, 30, commands.BucketType.user)
-    async def download_audio(self, ctx, url: str):
+    async def download_audio(self, ctx, *, url: str):
         await self.handle_download(ctx, url, is_audio=True)
 
     # Video errors
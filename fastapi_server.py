@@ -1,8 +1,26 @@
-# fastapi_server.py: A simple FastAPI server for health checks and future webhooks. Currently just has a root endpoint that returns {"status": "ok"}.
-from fastapi import FastAPI
+# fastapi_server.py: A simple FastAPI server for health checks and future webhooks. Also serves the signed, expiring links /download and /audio post for files too big for Discord (see utils/file_share.py).
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse
+
+from utils.file_share import file_share
 
 app = FastAPI()
 
+
+class SharedFileResponse(FileResponse):
+    # Range requests and HEAD come with FileResponse; so does zero-copy (ASGI pathsend) on servers that offer it.
+    # Uvicorn doesn't, so bigger reads at least cut the per-chunk overhead.
+    chunk_size = 1024 * 1024
+
+
 @app.get("/")
 async def root():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.api_route("/files/{entry}/{name}", methods=["GET", "HEAD"])
+async def shared_file(entry: str, name: str, sig: str = ""):
+    path = file_share.resolve(entry, name, sig)
+    if path is None:
+        raise HTTPException(status_code=404)    # forged, expired and deleted all look the same
+    return SharedFileResponse(path, filename=name, content_disposition_type="inline")
@@ -9,6 +9,7 @@ import asyncio
 import uvicorn
 import json
 from fastapi_server import app
+from utils.http_client import http_client
 from dotenv import load_dotenv
 
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
@@ -44,6 +45,8 @@ class Freesona(commands.Bot):
         self._legacy_notice_sent = False  # guard: only DM once per session
 
     async def setup_hook(self):
+        await http_client.start()
+
         extensions = [
             "cogs.ytdlp", "cogs.hello", "cogs.help",
             "cogs.utils", "cogs.genai", "cogs.wolfram", "cogs.status",
@@ -55,6 +58,10 @@ class Freesona(commands.Bot):
         await self.tree.sync()
         print(f"Synced slash commands for {self.user}")
 
+    async def close(self):
+        await super().close()
+        await http_client.close()
+
     async def notify_owner_legacy(self, bot_name: str):
         """DM the bot owner about legacy persona.txt — called from genai cog."""
         if self._legacy_notice_sent:
@@ -0,0 +1,100 @@
+# scripts/bench_segmenter.py: Microbenchmark for utils/segmenter.py against the split_into_segments it replaced.
+# Checks first that chat-mode output still matches the old splitter on replies both handle (prose, no code fences,
+# nothing over the message limit), then times both on the same seeded workloads.
+#
+#   python scripts/bench_segmenter.py [--runs N]
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.segmenter import segment_text  # noqa: E402
+
+WORDS = ("the model replies with a few short words and some longer explanations about discord bots python "
+         "asyncio regex segments paragraphs sentences limits embeds").split()
+
+
+# ---------------------------------------------------------------------------
+# Reference: utils/generation.split_into_segments before the segmenter
+# ---------------------------------------------------------------------------
+
+def split_into_segments(text: str) -> list[str]:
+    if len(text) < 280:
+        return [text]
+
+    paragraphs = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
+    if len(paragraphs) <= 1:
+        sentences = re.split(r"(?<=[.!?])\s+", text)
+        chunks: list[str] = []
+        current = ""
+        for s in sentences:
+            if len(current) + len(s) > 220 and current:
+                chunks.append(current.strip())
+                current = s
+            else:
+                current = (current + " " + s).strip() if current else s
+        if current:
+            chunks.append(current.strip())
+        return chunks if len(chunks) > 1 else [text]
+
+    return paragraphs
+
+
+# ---------------------------------------------------------------------------
+# Workloads
+# ---------------------------------------------------------------------------
+
+def sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(4, 22))
+    return " ".join(words).capitalize() + rng.choice(".!?")
+
+
+def paragraph(rng: random.Random, chars: int) -> str:
+    out, size = [], 0
+    while size < chars:
+        out.append(sentence(rng))
+        size += len(out[-1]) + 1
+    return " ".join(out)
+
+
+def workloads(seed: int = 1) -> dict[str, str]:
+    rng = random.Random(seed)
+    return {
+        "short":           sentence(rng),
+        "6 paragraphs":    "\n\n".join(paragraph(rng, 650) for _ in range(6)),
+        "1 long paragraph": paragraph(rng, 1900),
+        "1 huge paragraph": paragraph(rng, 4000),
+    }
+
+
+def check(samples: int = 2000) -> None:
+    rng = random.Random(2)
+    for _ in range(samples):
+        if rng.random() < 0.5:
+            text = paragraph(rng, rng.randint(100, 1900))
+        else:
+            text = "\n\n".join(paragraph(rng, rng.randint(50, 600)) for _ in range(rng.randint(2, 8)))
+        assert segment_text(text) == split_into_segments(text), text
+    print(f"chat output identical to split_into_segments on {samples} random replies")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=2000, help="calls per timing")
+    args = parser.parse_args()
+
+    check()
+    print(f"{'workload':18} {'chars':>6} {'old us':>9} {'new us':>9}")
+    for name, text in workloads().items():
+        old = min(timeit.repeat(lambda: split_into_segments(text), number=args.runs, repeat=5)) / args.runs * 1e6
+        new = min(timeit.repeat(lambda: segment_text(text), number=args.runs, repeat=5)) / args.runs * 1e6
+        print(f"{name:18} {len(text):6} {old:9.1f} {new:9.1f}   ({old / new:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# scripts/bench_wolfram_format.py: Microbenchmark for utils/wolfram_format.py against the re.sub chain it replaced.
+# Checks first that the output and result expression match the old chain on the sample responses in
+# tests/fixtures/wolfram (synthetic until real captures replace them) and on seeded random mixes of their pieces,
+# then times both on each sample. Timings are relative costs on those samples, not measurements of live traffic.
+#
+#   python scripts/bench_wolfram_format.py [--runs N] [--write-golden]
+#
+# --write-golden regenerates tests/fixtures/wolfram/golden.json from the old chain (after changing the samples).
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from utils.wolfram_format import format_wolfram_text  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures", "wolfram")
+GOLDEN   = os.path.join(FIXTURES, "golden.json")
+
+# Pieces the fuzzer mixes: every pattern's trigger, its near misses, and the non-ASCII path
+FRAGMENTS = [
+    "Query:\n\"x^2\"\n", "Input interpretation:\nintegrate x^2\n", "input interpretation: lower\n",
+    "Result:\nx^3/3 + C\n", "RESULT: 42\n", "Result:\n\n\n7 km/h\n", "Results:\nx = 2\nx = 3\n",
+    "Result: 5 https://example.com/r\n", "Result:\n", "`tick` Result: a`b\n",
+    "image: https://www6b.wolframalpha.com/Calculate/MSP/MSP1?s=1\n", "Plot: http://a.b/c\n",
+    "URL: https://x.y\n", "İmage: https://i.x\n", "ımage:http://j\n", "PLOT:\nhttps://k\n",
+    "see https://wolframalpha.com/input?i=x\n", "https://\n",
+    "Wolfram Language code:\nIntegrate[x^2, x]\n", "wolfram language code: N[Pi]\n",
+    "Wolfram|Alpha website result for \"x\":\nhttps://www.wolframalpha.com/input?i=x\n",
+    "wolfram | alpha website result\n", "Wolfram Alpha website result\n",
+    "1 | hassium | 41 g/cm^3 |\n", "name | value\n", "a:b | c\n", " | leading pipe\n", "||\n",
+    "Alternate form:\nx^3/3\n", "\n", "\n\n", "   \n", "\t\n", "  padded  ", "plain text ",
+    "Ωmega | ünïcode\n", "Reſult: long s\n", "KELVIN Kresult: sign\n", "√2 ≈ 1.414\n", "π | 3.14159\n",
+]
+
+
+# ---------------------------------------------------------------------------
+# Reference: cogs/wolfram.Wolfram.format_wolfram_text before utils/wolfram_format
+# ---------------------------------------------------------------------------
+
+def old_format(text: str) -> str:
+    if not text: return "No result found."
+
+    # 1. Strip absolute noise
+    text = re.sub(r'(?i)Wolfram Language code:.*', '', text)
+    text = re.sub(r'(?i)Wolfram\s*\|\s*Alpha website result.*', '', text)
+
+    # 2. Focus on core content
+    if "Input interpretation" in text:
+        text = text[text.find("Input interpretation"):]
+
+    # 3. Result capture
+    text = re.sub(r'(?i)Result:\s*\n*(.+)', r'**Result:** `\1`', text)
+
+    # 4. Clean up metadata URLs but keep text
+    text = re.sub(r'(?i)(plot|image|url):\s*https?://\S+', '', text)
+    text = re.sub(r'https?://\S+', '', text)
+
+    # 5. Bold table headers
+    text = re.sub(r'(?m)^([^:\n|]+)\s*\|\s*([^\n]+)', r'**\1** | \2', text)
+
+    text = re.sub(r'\n\s*\n', '\n', text)
+    return text.strip()
+
+
+def old_expr(formatted: str):
+    match = re.search(r'\*\*Result:\*\*\s*`([^`]+)`', formatted)
+    return match.group(1) if match else None
+
+
+def old(text: str) -> tuple:
+    formatted = old_format(text)
+    return formatted, old_expr(formatted)
+
+
+# ---------------------------------------------------------------------------
+# Workloads
+# ---------------------------------------------------------------------------
+
+def fixtures() -> dict[str, str]:
+    responses = {}
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.endswith(".txt"):
+            with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+                responses[name[:-4]] = f.read()
+    return responses
+
+
+def write_golden() -> None:
+    golden = {}
+    for name, text in fixtures().items():
+        formatted, expr = old(text)
+        golden[name] = {"text": formatted, "expr": expr}
+    with open(GOLDEN, "w", encoding="utf-8") as f:
+        json.dump(golden, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"wrote {len(golden)} golden outputs to {os.path.relpath(GOLDEN)}")
+
+
+def check(samples: int = 20000) -> None:
+    responses = fixtures()
+    for name, text in responses.items():
+        assert format_wolfram_text(text) == old(text), name
+
+    rng = random.Random(3)
+    pieces = FRAGMENTS + [line + "\n" for text in responses.values() for line in text.splitlines()]
+    for _ in range(samples):
+        text = "".join(rng.choices(pieces, k=rng.randint(0, 14)))
+        assert format_wolfram_text(text) == old(text), repr(text)
+    print(f"output identical to the old chain on {len(responses)} sample responses and {samples} random mixes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=2000, help="calls per timing")
+    parser.add_argument("--write-golden", action="store_true", help="regenerate golden.json from the old chain")
+    args = parser.parse_args()
+
+    if args.write_golden:
+        write_golden()
+        return
+
+    check()
+    print(f"{'response':12} {'chars':>6} {'old us':>9} {'new us':>9}")
+    for name, text in fixtures().items():
+        old_us = min(timeit.repeat(lambda: old(text), number=args.runs, repeat=5)) / args.runs * 1e6
+        new_us = min(timeit.repeat(lambda: format_wolfram_text(text), number=args.runs, repeat=5)) / args.runs * 1e6
+        print(f"{name:12} {len(text):6} {old_us:9.1f} {new_us:9.1f}   ({old_us / new_us:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# tests/test_segmenter.py: Size guarantees of utils/segmenter.py.
+# Whatever the reply looks like, no segment may be longer than `limit`: Discord rejects the send otherwise.
+
+import random
+
+import pytest
+
+from utils.segmenter import DISCORD_EMBED_LIMIT, DISCORD_MESSAGE_LIMIT, FENCE, segment_text
+
+WORDS = "the bot answers with short words and a few rather longer explanations https://example.com/a/b".split()
+
+MODES = [
+    pytest.param(DISCORD_MESSAGE_LIMIT, False, id="chat"),
+    pytest.param(DISCORD_MESSAGE_LIMIT, True, id="packed"),
+    pytest.param(DISCORD_EMBED_LIMIT, True, id="embed"),
+]
+
+
+def prose(rng: random.Random, chars: int) -> str:
+    out, size = [], 0
+    while size < chars:
+        out.append(" ".join(rng.choices(WORDS, k=rng.randint(3, 20))).capitalize() + rng.choice(".!?"))
+        size += len(out[-1]) + 1
+    return " ".join(out)
+
+
+def fence(rng: random.Random, chars: int) -> str:
+    if rng.random() < 0.3:
+        return FENCE + "x" * chars + FENCE                                  # all on one line
+    lines = ["    value = compute(%d)" % i + " " * rng.randint(0, 3) for i in range(chars // 24 + 1)]
+    if rng.random() < 0.2:
+        lines.append("y" * rng.randint(500, 5000))                         # one huge line
+    return FENCE + rng.choice(["", "python", "py"]) + "\n" + "\n".join(lines) + "\n" + FENCE
+
+
+def reply(rng: random.Random) -> str:
+    blocks = []
+    for _ in range(rng.randint(1, 6)):
+        size = rng.choice([50, 300, 1500, 2500, 6000])
+        blocks.append(fence(rng, size) if rng.random() < 0.35 else prose(rng, size))
+    return "\n\n".join(blocks)
+
+
+def assert_fits(text: str, limit: int, pack: bool) -> None:
+    segments = segment_text(text, limit=limit, pack=pack)
+    assert segments
+    assert max(map(len, segments)) <= limit
+
+
+@pytest.mark.parametrize("limit, pack", MODES)
+@pytest.mark.parametrize("text", [
+    FENCE + "x" * 3000 + FENCE,
+    FENCE + "x" * 5000 + FENCE,
+    FENCE + "x" * 5000,                                                     # never closed
+    FENCE + "py" + "z" * 4500 + "\nprint(1)\n" + FENCE,                    # opening line too long to repeat
+    "Before the code.\n\n" + FENCE + "y" * 3000 + FENCE + "\n\nAfter it.",
+    "word " * 1000,
+    "x" * 4500,
+], ids=["fence-3000", "fence-5000", "open-fence", "long-header", "fence-in-reply", "long-prose", "one-token"])
+def test_edge_cases_fit(text, limit, pack):
+    assert_fits(text, limit, pack)
+
+
+@pytest.mark.parametrize("limit, pack", MODES)
+def test_random_replies_fit(limit, pack):
+    rng = random.Random(limit + pack)
+    for _ in range(300):
+        assert_fits(reply(rng), limit, pack)
+
+
+def test_one_line_fence_is_rewrapped():
+    segments = segment_text(FENCE + "x" * 3000 + FENCE)
+    assert all(s.startswith(FENCE + "\n") and s.endswith("\n" + FENCE) for s in segments)
+    assert "".join(s[len(FENCE) + 1:-len(FENCE) - 1] for s in segments) == "x" * 3000
+
+
+def test_short_reply_is_untouched():
+    assert segment_text("hi there") == ["hi there"]
@@ -0,0 +1,40 @@
+# tests/test_wolfram_format.py: Golden-output tests for utils/wolfram_format.py.
+# fixtures/wolfram holds synthetic responses, hand-written in the LLM API's documented layout until real captures
+# replace them; golden.json is what the original re.sub chain produced for each (regenerate with
+# `python scripts/bench_wolfram_format.py --write-golden` after changing them).
+
+import json
+import os
+
+import pytest
+
+from utils.wolfram_format import NO_RESULT, extract_result, format_wolfram_text
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "wolfram")
+
+with open(os.path.join(FIXTURES, "golden.json"), encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+
+
+def load(name: str) -> str:
+    with open(os.path.join(FIXTURES, f"{name}.txt"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_every_fixture_has_a_golden_output():
+    names = {name[:-4] for name in os.listdir(FIXTURES) if name.endswith(".txt")}
+    assert names == set(GOLDEN)
+
+
+@pytest.mark.parametrize("name", sorted(GOLDEN))
+def test_matches_old_chain(name):
+    assert format_wolfram_text(load(name)) == (GOLDEN[name]["text"], GOLDEN[name]["expr"])
+
+
+@pytest.mark.parametrize("name", sorted(GOLDEN))
+def test_extract_result_agrees(name):
+    assert extract_result(GOLDEN[name]["text"]) == GOLDEN[name]["expr"]
+
+
+def test_empty_response():
+    assert format_wolfram_text("") == (NO_RESULT, None)
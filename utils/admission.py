@@ -0,0 +1,162 @@
+# utils/admission.py: Bounded admission queue for on_message generation.
+# Caps how many debounced responses can wait for a generation slot (overall, per user and per guild),
+# and drops anything that waited too long instead of answering minutes late.
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger("FreesonaBot")
+
+MAX_ACTIVE       = 2    # generations running at once
+MAX_QUEUED       = 25   # tickets held overall (waiting + active)
+MAX_PER_USER     = 2    # 2, not 1: a debounced task is replaced before its ticket is released
+MAX_PER_GUILD    = 8
+MAX_WAIT_SECONDS = 45   # past this, a reply is no longer worth sending
+
+QUEUED_REACTION  = "⏳"
+DROPPED_REACTION = "💤"
+
+
+class AdmissionExpired(Exception):
+    pass
+
+
+@dataclass
+class Ticket:
+    user_id: int
+    guild_id: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    waiting: bool = False
+    active: bool = False
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.enqueued_at
+
+
+class AdmissionQueue:
+    def __init__(
+        self,
+        *,
+        max_active: int = MAX_ACTIVE,
+        max_queued: int = MAX_QUEUED,
+        max_per_user: int = MAX_PER_USER,
+        max_per_guild: int = MAX_PER_GUILD,
+        max_wait: float = MAX_WAIT_SECONDS,
+    ):
+        self.max_active    = max_active
+        self.max_queued    = max_queued
+        self.max_per_user  = max_per_user
+        self.max_per_guild = max_per_guild
+        self.max_wait      = max_wait
+
+        self._slots   = asyncio.Semaphore(max_active)
+        self._tickets: list[Ticket] = []
+        self._per_user:  Counter = Counter()
+        self._per_guild: Counter = Counter()
+
+        self.dropped: Counter = Counter()  # reason -> count
+        self.admitted  = 0
+        self.completed = 0
+
+    # -------------------------------------------------------------------
+    # Admission
+    # -------------------------------------------------------------------
+
+    def admit(self, user_id: int, guild_id: int) -> Optional[Ticket]:
+        """Returns a ticket, or None if the request is shed."""
+        reason = None
+        if len(self._tickets) >= self.max_queued:
+            reason = "full"
+        elif self._per_user[user_id] >= self.max_per_user:
+            reason = "user"
+        elif self._per_guild[guild_id] >= self.max_per_guild:
+            reason = "guild"
+
+        if reason:
+            self.dropped[reason] += 1
+            logger.info(f"Admission: shed message from user {user_id} in guild {guild_id} ({reason})")
+            return None
+
+        ticket = Ticket(user_id=user_id, guild_id=guild_id)
+        self._tickets.append(ticket)
+        self._per_user[user_id]   += 1
+        self._per_guild[guild_id] += 1
+        self.admitted += 1
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket not in self._tickets:
+            return
+        self._tickets.remove(ticket)
+        self._per_user[ticket.user_id]   -= 1
+        self._per_guild[ticket.guild_id] -= 1
+        if self._per_user[ticket.user_id] <= 0:
+            del self._per_user[ticket.user_id]
+        if self._per_guild[ticket.guild_id] <= 0:
+            del self._per_guild[ticket.guild_id]
+
+    # -------------------------------------------------------------------
+    # Waiting for a slot
+    # -------------------------------------------------------------------
+
+    def saturated(self) -> bool:
+        return self._slots.locked()
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in line for a ticket about to wait (slots are handed out FIFO)."""
+        return sum(1 for t in self._tickets if t.waiting and t is not ticket) + 1
+
+    @asynccontextmanager
+    async def slot(self, ticket: Ticket):
+        """Holds a generation slot; raises AdmissionExpired if the ticket ages out while waiting."""
+        remaining = self.max_wait - ticket.age
+        if remaining <= 0:
+            self.dropped["expired"] += 1
+            raise AdmissionExpired(f"waited {ticket.age:.1f}s before a slot was requested")
+
+        ticket.waiting = True
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=remaining)
+        except asyncio.TimeoutError:
+            self.dropped["expired"] += 1
+            raise AdmissionExpired(f"waited {ticket.age:.1f}s for a slot")
+        finally:
+            ticket.waiting = False
+
+        ticket.active = True
+        try:
+            yield
+        finally:
+            ticket.active = False
+            self.completed += 1
+            self._slots.release()
+
+    # -------------------------------------------------------------------
+    # Stats
+    # -------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        return {
+            "depth":     len(self._tickets),
+            "waiting":   sum(1 for t in self._tickets if t.waiting),
+            "active":    sum(1 for t in self._tickets if t.active),
+            "admitted":  self.admitted,
+            "completed": self.completed,
+            "dropped":   dict(self.dropped),
+        }
+
+
+def position_emoji(position: int) -> str:
+    """Keycap digit for queue positions 1-9, hourglass beyond that."""
+    if 1 <= position <= 9:
+        return f"{position}️⃣"
+    return QUEUED_REACTION
+
+
+admission = AdmissionQueue()
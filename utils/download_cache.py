@@ -0,0 +1,174 @@
+# utils/download_cache.py: Content-addressed disk cache for finished downloads (/download, /audio, /separate).
+# Entries are keyed on the extractor's canonical media id plus mode and size target, so the same clip linked ten
+# times (or through different URLs) is fetched and compressed once. The total size is capped with LRU eviction by
+# mtime; files are staged inside the cache root and renamed into place, so concurrent writers never see half a file.
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger("FreesonaBot")
+
+DOWNLOAD_CACHE_DIR   = os.getenv("DOWNLOAD_CACHE_DIR", "download_cache")
+DOWNLOAD_CACHE_BYTES = int(os.getenv("DOWNLOAD_CACHE_MB", 1024)) * 1024 * 1024
+EVICT_GRACE          = 15 * 60     # entries used this recently may still be uploading; never evicted
+MAX_ALIASES          = 2000
+
+_STAGING = ".staging"
+
+
+class DownloadCache:
+    def __init__(self, root: str = DOWNLOAD_CACHE_DIR, max_bytes: int = DOWNLOAD_CACHE_BYTES):
+        self.root      = root
+        self.max_bytes = max_bytes
+        self.hits      = 0
+        self.misses    = 0
+        self._aliases: OrderedDict[str, str] = OrderedDict()   # "mode|target|url" -> key, skips the probe
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def key(info: dict, mode: str, target: Optional[int]) -> str:
+        media_id = f"{info.get('extractor_key') or info.get('extractor')}:{info.get('id')}"
+        return hashlib.sha256(f"{media_id}|{mode}|{target or 'any'}".encode()).hexdigest()[:32]
+
+    @staticmethod
+    def _alias(url: str, mode: str, target: Optional[int]) -> str:
+        return f"{mode}|{target or 'any'}|{url.strip()}"
+
+    def lock(self, key: str) -> asyncio.Lock:
+        """One download per key at a time; the second caller finds the first one's result."""
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def _entry_path(self, key: str) -> Optional[str]:
+        directory = os.path.join(self.root, key)
+        try:
+            names = [n for n in os.listdir(directory) if not n.startswith(".")]
+        except FileNotFoundError:
+            return None
+        return os.path.join(directory, names[0]) if names else None
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._entry_path(key)
+        if path is None:
+            self.misses += 1
+            return None
+        os.utime(os.path.join(self.root, key))  # LRU order is directory mtime
+        self.hits += 1
+        return path
+
+    def lookup_url(self, url: str, mode: str, target: Optional[int]) -> Optional[str]:
+        """Cached file for a URL seen before, without probing it again."""
+        alias = self._alias(url, mode, target)
+        key = self._aliases.get(alias)
+        if key is None:
+            return None
+        path = self._entry_path(key)
+        if path is None:
+            self._aliases.pop(alias, None)
+            return None
+        os.utime(os.path.join(self.root, key))
+        self.hits += 1
+        return path
+
+    def remember(self, url: str, mode: str, target: Optional[int], key: str) -> None:
+        alias = self._alias(url, mode, target)
+        self._aliases[alias] = key
+        self._aliases.move_to_end(alias)
+        while len(self._aliases) > MAX_ALIASES:
+            self._aliases.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Store
+    # ------------------------------------------------------------------
+
+    def put(self, key: str, src: str) -> str:
+        """Moves a finished file into the cache and returns its cached path. If another writer got there first,
+        theirs is kept and ours dropped."""
+        staging = os.path.join(self.root, _STAGING, uuid.uuid4().hex)
+        os.makedirs(staging)
+        shutil.move(src, os.path.join(staging, os.path.basename(src)))
+
+        final = os.path.join(self.root, key)
+        try:
+            os.rename(staging, final)
+        except OSError:
+            # Target exists: a concurrent writer (maybe another process) finished the same key
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+        return self._entry_path(key) or ""
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        now = time.time()
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith("."):
+                continue
+            directory = os.path.join(self.root, name)
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(directory) if e.is_file())
+                entries.append((os.stat(directory).st_mtime, size, directory))
+            except OSError:
+                continue
+            total += size
+
+        # Staging dirs left behind by a crash mid-move
+        staging_root = os.path.join(self.root, _STAGING)
+        for name in os.listdir(staging_root) if os.path.isdir(staging_root) else []:
+            path = os.path.join(staging_root, name)
+            try:
+                if now - os.stat(path).st_mtime > EVICT_GRACE:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue
+
+        entries.sort()
+        for mtime, size, directory in entries:
+            if total <= self.max_bytes:
+                break
+            if now - mtime < EVICT_GRACE:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+            logger.info(f"Download cache evicted {os.path.basename(directory)} ({size / 1e6:.1f}MB)")
+
+    def stats(self) -> dict:
+        entries, total = 0, 0
+        try:
+            for name in os.listdir(self.root):
+                if name.startswith("."):
+                    continue
+                entries += 1
+                total += sum(e.stat().st_size for e in os.scandir(os.path.join(self.root, name)) if e.is_file())
+        except OSError:
+            pass
+        lookups = self.hits + self.misses
+        return {
+            "entries":  entries,
+            "bytes":    total,
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+download_cache = DownloadCache()
@@ -0,0 +1,121 @@
+# utils/file_share.py: Signed, expiring links for downloads too big to upload to Discord.
+# Files are hard-linked out of the download cache (no copy) into SHARE_DIR/<expiry>-<token>/, and served by the
+# FastAPI app in fastapi_server.py. The expiry lives in the directory name and the HMAC covers it, so links need no
+# database, can't be extended or guessed, and the janitor only has to read directory names.
+
+import hashlib
+import hmac
+import logging
+import os
+import re
+import secrets
+import shutil
+import time
+import zipfile
+from typing import Optional
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+# fastapi_server (and so this module) is imported by main.py before it loads .env
+load_dotenv()
+
+logger = logging.getLogger("FreesonaBot")
+
+SHARE_BASE_URL  = os.getenv("SHARE_BASE_URL", "").rstrip("/")    # public URL of the FastAPI server; empty = off
+SHARE_DIR       = os.getenv("SHARE_DIR", "shared_files")
+SHARE_TTL       = int(os.getenv("SHARE_TTL", 24 * 60 * 60))       # seconds
+SHARE_MAX_BYTES = int(os.getenv("SHARE_MAX_MB", 500)) * 1024 * 1024
+SHARE_SECRET    = os.getenv("SHARE_SECRET", "")                   # unset: random per run, links die on restart
+
+_ENTRY_RE = re.compile(r"^(\d+)-[A-Za-z0-9_-]+$")
+
+
+def write_bundle(paths: list[str], dest: str) -> None:
+    """Zips `paths` into `dest`, numbered in order. Stored, not deflated: media doesn't compress."""
+    with zipfile.ZipFile(dest, "w", zipfile.ZIP_STORED) as bundle:
+        for index, path in enumerate(paths, 1):
+            bundle.write(path, f"{index:02d} - {os.path.basename(path)}")
+
+
+class FileShare:
+    def __init__(self, root: str = SHARE_DIR, base_url: str = SHARE_BASE_URL, ttl: int = SHARE_TTL,
+                 max_bytes: int = SHARE_MAX_BYTES, secret: str = SHARE_SECRET):
+        self.root      = root
+        self.base_url  = base_url
+        self.ttl       = ttl
+        self.max_bytes = max_bytes
+        self._secret   = (secret or secrets.token_hex(32)).encode()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def _sign(self, entry: str, name: str) -> str:
+        return hmac.new(self._secret, f"{entry}/{name}".encode(), hashlib.sha256).hexdigest()[:32]
+
+    # ------------------------------------------------------------------
+    # Publish / resolve
+    # ------------------------------------------------------------------
+
+    def _new_entry(self) -> tuple[str, str, int]:
+        expires = int(time.time()) + self.ttl
+        entry = f"{expires}-{secrets.token_urlsafe(9)}"
+        directory = os.path.join(self.root, entry)
+        os.makedirs(directory)
+        return entry, directory, expires
+
+    def _url(self, entry: str, name: str) -> str:
+        return f"{self.base_url}/files/{entry}/{quote(name)}?sig={self._sign(entry, name)}"
+
+    def publish(self, src: str) -> tuple[str, int]:
+        """Makes `src` downloadable until the TTL runs out. Returns (url, expiry as a unix timestamp)."""
+        entry, directory, expires = self._new_entry()
+        name = os.path.basename(src)
+        dst = os.path.join(directory, name)
+        try:
+            os.link(src, dst)           # same filesystem as the download cache: free, and survives its eviction
+        except OSError:
+            shutil.copyfile(src, dst)
+        return self._url(entry, name), expires
+
+    def publish_bundle(self, paths: list[str], name: str) -> tuple[str, int]:
+        """Zips `paths` straight into a new entry."""
+        entry, directory, expires = self._new_entry()
+        name = f"{name}.zip"
+        write_bundle(paths, os.path.join(directory, name))
+        return self._url(entry, name), expires
+
+    def resolve(self, entry: str, name: str, sig: str) -> Optional[str]:
+        """Path behind a link, or None when it's forged, expired or gone."""
+        match = _ENTRY_RE.match(entry)
+        if not match or int(match.group(1)) < time.time():
+            return None
+        if not hmac.compare_digest(sig, self._sign(entry, name)):
+            return None
+        path = os.path.join(self.root, entry, name)
+        return path if os.path.isfile(path) else None
+
+    # ------------------------------------------------------------------
+    # Janitor
+    # ------------------------------------------------------------------
+
+    def sweep(self) -> int:
+        """Deletes expired entries. Returns how many were removed."""
+        removed = 0
+        now = time.time()
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            match = _ENTRY_RE.match(name)
+            if match and int(match.group(1)) < now:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"File share janitor removed {removed} expired file(s)")
+        return removed
+
+
+file_share = FileShare()
@@ -2,8 +2,8 @@
 # This module handles all interactions with the Gemini API, including prompt assembly, response parsing, error handling, and rate limiting.
 
 import os
-import re
 import asyncio
+import contextlib
 import logging
 import time
 from dataclasses import dataclass, field
@@ -16,7 +16,9 @@ from google.genai import types
 
 from utils.memory import memory_to_contents, push_memory
 from utils.security import sanitize_prompt, unsafe_output
-from utils.config import LAST_DEBUG
+from utils.config import LAST_DEBUG, load_config
+from utils.outbound import get_outbox, resolve_send_mode
+from utils.segmenter import segment_text, truncate_text
 
 load_dotenv()
 
@@ -27,7 +29,6 @@ BOT_NAME       = os.getenv("BOT_NAME", "Bot")
 MODEL_NAME     = "gemini-flash-lite-latest"
 
 # Split messaging
-SPLIT_MIN_LENGTH     = 280
 SPLIT_DELAY_BASE     = 1.2
 SPLIT_DELAY_PER_CHAR = 0.012
 SPLIT_DELAY_MAX      = 3.5
@@ -119,33 +120,11 @@ async def rate_limit():
     call_timestamps.append(time.time())
 
 # ---------------------------------------------------------------------------
-# Text splitter + response builder
+# Response builder
 # ---------------------------------------------------------------------------
 
-def split_into_segments(text: str) -> list[str]:
-    if len(text) < SPLIT_MIN_LENGTH:
-        return [text]
-
-    paragraphs = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
-    if len(paragraphs) <= 1:
-        sentences = re.split(r"(?<=[.!?])\s+", text)
-        chunks: list[str] = []
-        current = ""
-        for s in sentences:
-            if len(current) + len(s) > 220 and current:
-                chunks.append(current.strip())
-                current = s
-            else:
-                current = (current + " " + s).strip() if current else s
-        if current:
-            chunks.append(current.strip())
-        return chunks if len(chunks) > 1 else [text]
-
-    return paragraphs
-
-
 def build_response(text: str) -> ConversationResponse:
-    segments_text = split_into_segments(text)
+    segments_text = segment_text(text)
     segments = []
     for seg in segments_text:
         delay = min(
@@ -155,16 +134,6 @@ def build_response(text: str) -> ConversationResponse:
         segments.append(MessageSegment(text=seg, delay=delay, typing=True))
     return ConversationResponse(segments=segments)
 
-
-def clean_text(text: str, limit: int = 4000) -> str:
-    if len(text) <= limit:
-        return text
-    cut = text[:limit]
-    last_dot = cut.rfind('.')
-    if last_dot > 1000:
-        return cut[:last_dot + 1]
-    return cut
-
 # ---------------------------------------------------------------------------
 # Multi-message sender
 # ---------------------------------------------------------------------------
@@ -174,7 +143,13 @@ async def send_response(
     channel: discord.abc.Messageable,
     *,
     reply_to: Optional[discord.Message] = None,
+    mode: Optional[str] = None,
 ) -> None:
+    """Sends all segments as one ordered burst per channel.
+
+    mode is "natural" (simulated typing delays) or "fast" (only Discord's rate limit paces segments);
+    it defaults to the send_mode stored in config.json.
+    """
     if not response.segments:
         return
 
@@ -182,33 +157,23 @@ async def send_response(
     if not segments:
         return
 
-    for i, segment in enumerate(segments):
-        if segment.typing and segment.delay > 0:
-            async with channel.typing():
-                await asyncio.sleep(segment.delay)
-
-        if i == 0 and reply_to is not None:
-            await reply_to.reply(segment.text)
-        else:
-            await channel.send(segment.text)
+    mode    = resolve_send_mode(mode or load_config().get("send_mode"))
+    natural = mode == "natural"
+    outbox  = get_outbox(channel.id)
 
-# ---------------------------------------------------------------------------
-# Attachment helper
-# ---------------------------------------------------------------------------
+    async with outbox.lock:
+        # One typing indicator for the whole reply instead of one per segment
+        typing = channel.typing() if natural else contextlib.nullcontext()
+        async with typing:
+            for i, segment in enumerate(segments):
+                if natural and segment.typing and segment.delay > 0:
+                    await asyncio.sleep(segment.delay)
 
-async def extract_image(message: Optional[discord.Message]) -> tuple[Optional[bytes], Optional[str]]:
-    """Extract all image attachments and return them as a list of (bytes, mime_type) tuples."""
-    if not message or not message.attachments:
-        return None, None
-    # Process first image attachment for now; multi-image batch is roadmap
-    for att in message.attachments:
-        if att.content_type and "image" in att.content_type:
-            try:
-                image_bytes = await att.read()
-                return image_bytes, att.content_type
-            except Exception as e:
-                logger.error(f"Failed to read attachment: {e}")
-    return None, None
+                await outbox.bucket.take()
+                if i == 0 and reply_to is not None:
+                    await reply_to.reply(segment.text)
+                else:
+                    await channel.send(segment.text)
 
 # ---------------------------------------------------------------------------
 # Core generation
@@ -222,8 +187,7 @@ async def generate(
     apply_persona: bool = True,
     instruction_prefix: str = "",
     username: str = "",
-    image_bytes: Optional[bytes] = None,
-    image_mime: Optional[str] = None,
+    images: Optional[list[tuple[bytes, str]]] = None,
 ) -> ConversationResponse:
     await rate_limit()
     prompt = sanitize_prompt(prompt)
@@ -236,7 +200,7 @@ async def generate(
     parts = []
     if user_text:
         parts.append(types.Part(text=user_text))
-    if image_bytes:
+    for image_bytes, image_mime in images or []:
         parts.append(types.Part.from_bytes(data=image_bytes, mime_type=image_mime or "image/png"))
     if not parts:
         parts.append(types.Part(text="Describe this image"))
@@ -261,7 +225,7 @@ async def generate(
         if not response or not response.text:
             raise MalformedResponseError("Empty response from model.")
 
-        text = clean_text(response.text)
+        text = truncate_text(response.text)
 
         if unsafe_output(text):
             logger.warning("Output blocked by safety filter.")
@@ -0,0 +1,101 @@
+# utils/http_client.py: Shared pooled aiohttp session for every cog.
+# One connector for the whole bot keeps TCP/TLS connections and DNS lookups warm between calls,
+# and a trace hook records per-upstream latency and errors.
+
+import logging
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger("FreesonaBot")
+
+POOL_LIMIT          = 100   # connections overall
+POOL_LIMIT_PER_HOST = 10
+KEEPALIVE_SECONDS   = 30
+DNS_CACHE_SECONDS   = 300
+
+# No overall cap by default: MVSEP uploads can legitimately take minutes. Callers pass tighter timeouts per request.
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+
+
+@dataclass
+class UpstreamStats:
+    requests: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    last_ms: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.requests if self.requests else 0.0
+
+
+class HTTPClientManager:
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.upstreams: dict[str, UpstreamStats] = {}
+
+    # -------------------------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------------------------
+
+    async def start(self) -> aiohttp.ClientSession:
+        return self.session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session. Started in setup_hook; created on demand if a caller gets here first."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                limit_per_host=POOL_LIMIT_PER_HOST,
+                keepalive_timeout=KEEPALIVE_SECONDS,
+                ttl_dns_cache=DNS_CACHE_SECONDS,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=DEFAULT_TIMEOUT,
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    # -------------------------------------------------------------------
+    # Metrics
+    # -------------------------------------------------------------------
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_start(session, ctx: SimpleNamespace, params):
+            ctx.start = time.perf_counter()
+
+        async def on_end(session, ctx: SimpleNamespace, params):
+            self._record(params.url.host, ctx.start, error=params.response.status >= 500)
+
+        async def on_exception(session, ctx: SimpleNamespace, params):
+            self._record(params.url.host, ctx.start, error=True)
+
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_exception)
+        return trace
+
+    def _record(self, host: Optional[str], start: float, *, error: bool) -> None:
+        stats = self.upstreams.setdefault(host or "unknown", UpstreamStats())
+        elapsed = (time.perf_counter() - start) * 1000
+        stats.requests += 1
+        stats.total_ms += elapsed
+        stats.last_ms   = elapsed
+        if error:
+            stats.errors += 1
+
+
+http_client = HTTPClientManager()
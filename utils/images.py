@@ -0,0 +1,167 @@
+# utils/images.py: Image ingestion for AI prompts.
+# Checks attachment sizes before downloading, then downscales/recompresses in worker threads so a 12MP phone photo
+# doesn't cost seconds of upload and megabytes of RSS per message. Several images per message go out in one request.
+
+import asyncio
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+import discord
+from PIL import Image, ImageOps
+
+logger = logging.getLogger("FreesonaBot")
+
+IMAGE_MAX_COUNT         = 4                  # images per message sent to the model
+IMAGE_MAX_BYTES         = 20 * 1024 * 1024   # skip attachments larger than this without downloading
+IMAGE_MAX_SIDE          = 1536               # longest edge after downscaling
+IMAGE_PASSTHROUGH_BYTES = 512 * 1024         # small enough images are sent untouched
+IMAGE_JPEG_QUALITY      = 85
+IMAGE_DECODE_CONCURRENCY = 2                 # decodes running at once across all messages
+IMAGE_CACHE_BYTES       = 32 * 1024 * 1024   # budget for processed images kept in memory
+
+Image.MAX_IMAGE_PIXELS = 64_000_000  # refuse decompression bombs early
+
+_decode_slots = asyncio.Semaphore(IMAGE_DECODE_CONCURRENCY)
+
+ImagePart = tuple[bytes, str]  # (data, mime_type)
+
+
+# ---------------------------------------------------------------------------
+# Processed-image cache
+# The same attachment is often read by a reply, then /ask, then autonomy. Entries are keyed by content hash and
+# indexed by Discord attachment id, so a known attachment skips the download and identical bytes skip the resize.
+# ---------------------------------------------------------------------------
+
+class ImageCache:
+    def __init__(self, max_bytes: int = IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes     = 0
+        self.hits      = 0
+        self.misses    = 0
+        self._entries: OrderedDict[str, ImagePart] = OrderedDict()  # content hash -> processed image
+        self._ids:     dict[int, str]             = {}             # attachment id -> content hash
+        self._id_refs: dict[str, set[int]]        = {}             # content hash -> attachment ids
+
+    def get_by_id(self, att_id: int) -> Optional[ImagePart]:
+        digest = self._ids.get(att_id)
+        return self._touch(digest) if digest else None
+
+    def get_by_hash(self, digest: str) -> Optional[ImagePart]:
+        return self._touch(digest)
+
+    def _touch(self, digest: str) -> Optional[ImagePart]:
+        part = self._entries.get(digest)
+        if part is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return part
+
+    def put(self, att_id: int, digest: str, part: ImagePart) -> None:
+        self._ids[att_id] = digest
+        self._id_refs.setdefault(digest, set()).add(att_id)
+        if digest in self._entries:
+            self._entries.move_to_end(digest)
+            return
+        size = len(part[0])
+        if size > self.max_bytes:
+            return
+        self._entries[digest] = part
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            old_digest, old_part = self._entries.popitem(last=False)
+            self.bytes -= len(old_part[0])
+            for old_id in self._id_refs.pop(old_digest, ()):
+                self._ids.pop(old_id, None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+
+image_cache = ImageCache()
+
+# ---------------------------------------------------------------------------
+# Ingestion
+# ---------------------------------------------------------------------------
+
+def is_image_attachment(att: discord.Attachment) -> bool:
+    return bool(att.content_type and att.content_type.startswith("image/"))
+
+
+def downscale_image(data: bytes, mime: str) -> Optional[ImagePart]:
+    """Fits the image within IMAGE_MAX_SIDE and recompresses it, or None if it can't be decoded (corrupt,
+    unsupported, or a decompression bomb). Runs in a worker thread."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Pillow only raises above twice the limit and merely warns in between; refuse those too
+            if img.width * img.height > Image.MAX_IMAGE_PIXELS:
+                logger.warning(f"Skipping image of {img.width}x{img.height}: over the pixel limit")
+                return None
+            fits = max(img.size) <= IMAGE_MAX_SIDE
+            if fits and len(data) <= IMAGE_PASSTHROUGH_BYTES:
+                return data, mime
+
+            # JPEG can decode straight at a reduced scale, which skips most of the work
+            img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+            img.seek(0)  # first frame of animated GIF/WebP
+            frame = ImageOps.exif_transpose(img)
+            frame.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.Resampling.LANCZOS)
+
+            has_alpha = frame.mode in ("RGBA", "LA") or (frame.mode == "P" and "transparency" in frame.info)
+            out = io.BytesIO()
+            if has_alpha:
+                frame.save(out, format="WEBP", quality=IMAGE_JPEG_QUALITY, method=4)
+                result: ImagePart = (out.getvalue(), "image/webp")
+            else:
+                frame.convert("RGB").save(out, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+                result = (out.getvalue(), "image/jpeg")
+
+        # Recompression can occasionally lose to an already well-compressed original
+        if fits and len(result[0]) >= len(data):
+            return data, mime
+        return result
+    except Exception as e:
+        # Never forward bytes we couldn't decode ourselves
+        logger.warning(f"Skipping image that failed to decode: {type(e).__name__}: {e}")
+        return None
+
+
+async def ingest_attachment(att: discord.Attachment) -> Optional[ImagePart]:
+    if att.size > IMAGE_MAX_BYTES:
+        logger.info(f"Skipping image {att.filename}: {att.size} bytes exceeds cap")
+        return None
+
+    cached = image_cache.get_by_id(att.id)
+    if cached is not None:
+        return cached
+
+    try:
+        data = await att.read()
+    except Exception as e:
+        logger.error(f"Failed to read attachment: {e}")
+        return None
+
+    digest = hashlib.sha256(data).hexdigest()
+    cached = image_cache.get_by_hash(digest)
+    if cached is None:
+        async with _decode_slots:
+            cached = await asyncio.to_thread(downscale_image, data, att.content_type or "image/png")
+        if cached is None:
+            return None
+    image_cache.put(att.id, digest, cached)
+    return cached
+
+
+async def extract_images(message: Optional[discord.Message]) -> list[ImagePart]:
+    """Downloads and prepares up to IMAGE_MAX_COUNT image attachments, in attachment order."""
+    if not message or not message.attachments:
+        return []
+    atts = [a for a in message.attachments if is_image_attachment(a)][:IMAGE_MAX_COUNT]
+    if not atts:
+        return []
+    results = await asyncio.gather(*(ingest_attachment(a) for a in atts))
+    return [r for r in results if r is not None]
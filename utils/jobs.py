@@ -0,0 +1,153 @@
+# utils/jobs.py: Download job queue for /download, /audio and /separate.
+# Jobs are deduplicated on what they produce, so a URL already being fetched gets the running job instead of a
+# second yt-dlp. Downloads and transcodes each take a slot from their own bounded pool (sized from the CPU count),
+# and every requester's status message is edited with the job's queue position and progress until it finishes
+# (or, for a batch, with the aggregate of all its jobs).
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional
+
+import discord
+
+logger = logging.getLogger("FreesonaBot")
+
+_CPUS = os.cpu_count() or 1
+
+DOWNLOAD_WORKERS     = int(os.getenv("DOWNLOAD_WORKERS", max(2, min(4, _CPUS))))    # mostly network-bound
+TRANSCODE_WORKERS    = int(os.getenv("TRANSCODE_WORKERS", max(1, _CPUS // 2)))      # ffmpeg eats whole cores
+STATUS_EDIT_INTERVAL = 3.0    # seconds between status message edits
+BATCH_STATUS_LINES   = 5      # unfinished items listed under a batch's totals
+
+STAGE_LABELS = {
+    "queued":      "Queued",
+    "probing":     "Looking up",
+    "downloading": "Downloading",
+    "transcoding": "Compressing",
+    "finishing":   "Finishing",
+}
+
+
+class Job:
+    def __init__(self, key: str, queue: "JobQueue"):
+        self.key      = key
+        self.queue    = queue
+        self.stage    = "queued"
+        self.progress: Optional[float] = None   # 0..1 within the current stage, if known
+        self.task: Optional[asyncio.Task] = None
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+        self.progress = None
+
+    def set_progress(self, fraction: float) -> None:
+        self.progress = max(0.0, min(1.0, fraction))
+
+    def status(self) -> str:
+        position = self.queue.position(self)
+        if position is not None:
+            return f"{STAGE_LABELS['queued']} (#{position})"
+        label = STAGE_LABELS.get(self.stage, self.stage.capitalize())
+        return f"{label} {self.progress:.0%}" if self.progress is not None else f"{label}..."
+
+    async def wait(self) -> Any:
+        # Shielded: one requester giving up must not cancel the job for everyone attached to it
+        return await asyncio.shield(self.task)
+
+
+class JobQueue:
+    def __init__(self, download_workers: int = DOWNLOAD_WORKERS, transcode_workers: int = TRANSCODE_WORKERS):
+        self.workers = {"download": download_workers, "transcode": transcode_workers}
+        self._slots = {kind: asyncio.Semaphore(n) for kind, n in self.workers.items()}
+        self._waiting: dict[str, list[Job]] = {kind: [] for kind in self.workers}
+        self._active: dict[str, int] = {kind: 0 for kind in self.workers}
+        self.inflight: dict[str, Job] = {}
+        self.attached = 0   # requests that joined a running job instead of starting one
+
+    def submit(self, key: str, work: Callable[[Job], Awaitable[Any]]) -> Job:
+        """Starts `work(job)` unless a job with the same key is already running, in which case that one is returned."""
+        job = self.inflight.get(key)
+        if job is not None:
+            self.attached += 1
+            return job
+        job = Job(key, self)
+        self.inflight[key] = job
+        job.task = asyncio.create_task(self._run(job, work))
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]) -> Any:
+        try:
+            return await work(job)
+        finally:
+            self.inflight.pop(job.key, None)
+
+    @asynccontextmanager
+    async def slot(self, job: Job, kind: str):
+        """Holds one `kind` worker slot ("download" or "transcode") for the duration of the block."""
+        waiting = self._waiting[kind]
+        waiting.append(job)
+        try:
+            await self._slots[kind].acquire()
+        finally:
+            waiting.remove(job)
+        self._active[kind] += 1
+        try:
+            yield
+        finally:
+            self._active[kind] -= 1
+            self._slots[kind].release()
+
+    def position(self, job: Job) -> Optional[int]:
+        for waiting in self._waiting.values():
+            if job in waiting:
+                return waiting.index(job) + 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            kind: {"workers": n, "active": self._active[kind], "queued": len(self._waiting[kind])}
+            for kind, n in self.workers.items()
+        } | {"inflight": len(self.inflight), "attached": self.attached}
+
+
+job_queue = JobQueue()
+
+
+async def follow(job: Job, message: discord.PartialMessage, label: str) -> Any:
+    """Edits `message` with the job's status until it finishes, then returns its result (or raises its error)."""
+    last = None
+    while not job.task.done():
+        text = f"⏳ **{label}** • {job.status()}"
+        if text != last:
+            try:
+                await message.edit(content=text)
+                last = text
+            except discord.HTTPException as e:
+                logger.debug(f"Status edit skipped: {e}")
+        await asyncio.wait({job.task}, timeout=STATUS_EDIT_INTERVAL)
+    return await job.wait()
+
+
+async def follow_many(jobs: list[Job], message: discord.PartialMessage, label: str, names: list[str]) -> list[Any]:
+    """Like follow() for a batch: one message with the overall progress and the first few unfinished items.
+    Returns each job's result, or the exception it raised, in order."""
+    last = None
+    while not all(job.task.done() for job in jobs):
+        done = sum(job.task.done() for job in jobs)
+        overall = sum(1.0 if job.task.done() else job.progress or 0.0 for job in jobs) / len(jobs)
+        lines = [f"⏳ **{label}** • {done}/{len(jobs)} done • {overall:.0%}"]
+        unfinished = [(name, job) for name, job in zip(names, jobs) if not job.task.done()]
+        lines += [f"• `{name[:60]}` {job.status()}" for name, job in unfinished[:BATCH_STATUS_LINES]]
+        if len(unfinished) > BATCH_STATUS_LINES:
+            lines.append(f"• …and {len(unfinished) - BATCH_STATUS_LINES} more")
+        text = "\n".join(lines)
+        if text != last:
+            try:
+                await message.edit(content=text)
+                last = text
+            except discord.HTTPException as e:
+                logger.debug(f"Status edit skipped: {e}")
+        await asyncio.wait({job.task for job in jobs}, timeout=STATUS_EDIT_INTERVAL, return_when=asyncio.ALL_COMPLETED)
+    return await asyncio.gather(*(job.wait() for job in jobs), return_exceptions=True)
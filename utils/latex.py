@@ -0,0 +1,151 @@
+# utils/latex.py: Local math rendering for /math result images.
+# Renders with matplotlib's mathtext in a worker process (so a slow or pathological expression never blocks the
+# event loop) and keeps the PNGs in an LRU cache keyed by expression hash, so repeated results are instant.
+
+import asyncio
+import hashlib
+import io
+import logging
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger("FreesonaBot")
+
+RENDER_DPI          = 150
+RENDER_TIMEOUT      = 10                 # seconds
+RENDER_MAX_CHARS    = 300                # longer results aren't worth an image
+RENDER_CACHE_BYTES  = 16 * 1024 * 1024
+RENDER_FAILED_MAX   = 1024               # expressions remembered as unrenderable
+
+_executor: Optional[ProcessPoolExecutor] = None
+_cache: OrderedDict[str, bytes] = OrderedDict()
+_cache_bytes = 0
+_failed: OrderedDict[str, None] = OrderedDict()
+
+# Wolfram plain-text notation -> mathtext
+_TEX_REPLACEMENTS = (
+    ("≈", r"\approx "), ("≠", r"\neq "), ("≤", r"\leq "), ("≥", r"\geq "), ("±", r"\pm "),
+    ("×", r"\times "), ("·", r"\cdot "), ("π", r"\pi "), ("∞", r"\infty "),
+    ("∫", r"\int "), ("integral", r"\int "), ("°", r"^\circ "),
+    ("$", r"\$"), ("%", r"\%"), ("#", r"\#"), ("&", r"\&"), ("_", r"\_"),
+)
+
+
+_ROOT_OPERAND_RE = re.compile(r"[\w.]+")
+
+
+def _convert_roots(expr: str) -> str:
+    """√x and √(…) -> \\sqrt{…}: mathtext needs the radicand in braces."""
+    out, i = [], 0
+    while (j := expr.find("√", i)) != -1:
+        out.append(expr[i:j])
+        k = j + 1
+        if expr.startswith("(", k):
+            depth, end = 0, k
+            while end < len(expr):
+                depth += {"(": 1, ")": -1}.get(expr[end], 0)
+                if depth == 0:
+                    break
+                end += 1
+            out.append(r"\sqrt{" + _convert_roots(expr[k + 1:end]) + "}")
+            i = end + 1
+        elif match := _ROOT_OPERAND_RE.match(expr, k):
+            out.append(r"\sqrt{" + match.group() + "}")
+            i = match.end()
+        else:
+            out.append("√")     # nothing to take the root of; mathtext draws the bare sign as a symbol
+            i = k
+    out.append(expr[i:])
+    return "".join(out)
+
+
+def to_mathtext(expr: str) -> str:
+    expr = _convert_roots(expr)
+    for old, new in _TEX_REPLACEMENTS:
+        expr = expr.replace(old, new)
+    return expr
+
+
+def _render_png(tex: str, dpi: int) -> bytes:
+    """Runs in the worker process; matplotlib is only ever imported there."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.mathtext import math_to_image
+
+    buf = io.BytesIO()
+    math_to_image(f"${tex}$", buf, dpi=dpi, format="png")
+    return buf.getvalue()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=1)
+    return _executor
+
+
+def _cache_put(key: str, png: bytes) -> None:
+    global _cache_bytes
+    if len(png) > RENDER_CACHE_BYTES:
+        return
+    _cache[key] = png
+    _cache_bytes += len(png)
+    while _cache_bytes > RENDER_CACHE_BYTES:
+        _, old = _cache.popitem(last=False)
+        _cache_bytes -= len(old)
+
+
+def _remember_failure(key: str) -> None:
+    _failed[key] = None
+    if len(_failed) > RENDER_FAILED_MAX:
+        _failed.popitem(last=False)
+
+
+async def render_math(expr: str) -> Optional[bytes]:
+    """PNG bytes for a result expression, or None if it can't be rendered."""
+    if not expr or len(expr) > RENDER_MAX_CHARS:
+        return None
+    tex = to_mathtext(expr)
+    key = hashlib.sha256(f"{RENDER_DPI}|{tex}".encode()).hexdigest()
+
+    png = _cache.get(key)
+    if png is not None:
+        _cache.move_to_end(key)
+        return png
+    if key in _failed:
+        return None
+
+    loop = asyncio.get_running_loop()
+    try:
+        png = await asyncio.wait_for(
+            loop.run_in_executor(_get_executor(), _render_png, tex, RENDER_DPI), timeout=RENDER_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Math render timed out: {expr[:80]}")
+        shutdown_renderer()  # the stuck worker would block every later render
+        _remember_failure(key)
+        return None
+    except Exception as e:
+        logger.info(f"Math render failed for {expr[:80]!r}: {type(e).__name__}")
+        _remember_failure(key)
+        return None
+
+    _cache_put(key, png)
+    return png
+
+
+async def warm_renderer() -> None:
+    """Starts the worker and pays matplotlib's import cost before the first real /math."""
+    await render_math("0")
+
+
+def shutdown_renderer() -> None:
+    global _executor
+    if _executor is not None:
+        # ProcessPoolExecutor has no public way to kill a busy worker
+        for proc in list(getattr(_executor, "_processes", {}).values()):
+            proc.terminate()
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
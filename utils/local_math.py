@@ -0,0 +1,133 @@
+# utils/local_math.py: Local fast path for plain arithmetic in /math.
+# A whitelist AST evaluator: numbers, + - * / // ^, a handful of functions and constants. Inputs and intermediate
+# results are bounded so nothing can run away; anything it can't parse returns None and goes to Wolfram instead.
+# "%" is left to Wolfram too: it reads it as percent, not modulo.
+
+import ast
+import math
+import re
+from typing import Optional
+
+MAX_EXPR_CHARS  = 200
+MAX_NODES       = 100
+MAX_EXPONENT    = 1000
+MAX_INT_DIGITS  = 1000
+MAX_FACTORIAL   = 170
+SIG_DIGITS      = 12
+
+_FUNCTIONS = {
+    "sqrt": math.sqrt, "cbrt": lambda x: math.copysign(abs(x) ** (1 / 3), x),
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "asin": math.asin, "acos": math.acos, "atan": math.atan,
+    "sinh": math.sinh, "cosh": math.cosh, "tanh": math.tanh,
+    "ln": math.log, "log": math.log,  # natural log, as on Wolfram|Alpha
+    "log10": math.log10, "log2": math.log2, "exp": math.exp,
+    "abs": abs, "floor": math.floor, "ceil": math.ceil, "round": round,
+    "factorial": math.factorial,
+}
+_TRIG = {"sin", "cos", "tan"}
+_CONSTANTS = {"pi": math.pi, "π": math.pi, "e": math.e, "tau": math.tau}
+
+_PREFIX_RE = re.compile(r"^(what\s+is|what's|calculate|compute|evaluate|eval|solve)\s+", re.I)
+_REPLACEMENTS = (("^", "**"), ("×", "*"), ("·", "*"), ("÷", "/"), ("−", "-"), ("√", "sqrt"), ("π", "pi"))
+_ALLOWED_CHARS_RE = re.compile(r"^[\d\s.+\-*/()!,a-z_]+$")
+
+
+class _Reject(Exception):
+    pass
+
+
+def _prepare(query: str) -> Optional[str]:
+    expr = query.strip().rstrip("?=").strip()
+    expr = _PREFIX_RE.sub("", expr).lower()
+    expr = re.sub(r"√(\d+(?:\.\d+)?)", r"sqrt(\1)", expr)
+    for old, new in _REPLACEMENTS:
+        expr = expr.replace(old, new)
+    if not expr or len(expr) > MAX_EXPR_CHARS or not _ALLOWED_CHARS_RE.match(expr):
+        return None
+    if "!" in expr:
+        # n! -> factorial(n); only for plain integers, anything fancier goes to Wolfram
+        expr = re.sub(r"(\d+)!", r"factorial(\1)", expr)
+        if "!" in expr:
+            return None
+    return expr
+
+
+def _check_size(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        if value and math.log10(abs(value)) > MAX_INT_DIGITS:
+            raise _Reject("integer too large")
+    elif isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        raise _Reject("not finite")
+    return value
+
+
+def _eval(node: ast.AST):
+    if isinstance(node, ast.Expression):
+        return _eval(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in _CONSTANTS:
+        return _CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        value = _eval(node.operand)
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp):
+        left, right = _eval(node.left), _eval(node.right)
+        op = node.op
+        if isinstance(op, ast.Add):
+            return _check_size(left + right)
+        if isinstance(op, ast.Sub):
+            return _check_size(left - right)
+        if isinstance(op, ast.Mult):
+            return _check_size(left * right)
+        if isinstance(op, ast.Div):
+            if isinstance(left, int) and isinstance(right, int) and right and left % right == 0:
+                return left // right
+            return _check_size(left / right)
+        if isinstance(op, ast.FloorDiv):
+            return _check_size(left // right)
+        if isinstance(op, ast.Pow):
+            if abs(right) > MAX_EXPONENT:
+                raise _Reject("exponent too large")
+            if left and abs(right) * math.log10(abs(left)) > MAX_INT_DIGITS:
+                raise _Reject("power too large")
+            result = left ** right
+            if isinstance(result, complex):
+                raise _Reject("complex result")
+            return _check_size(result)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS and not node.keywords:
+        args = [_eval(a) for a in node.args]
+        if node.func.id == "factorial" and (len(args) != 1 or not isinstance(args[0], int) or not 0 <= args[0] <= MAX_FACTORIAL):
+            raise _Reject("factorial out of range")
+        result = _FUNCTIONS[node.func.id](*args)
+        if node.func.id in _TRIG and abs(result) < 1e-12:
+            result = 0.0  # sin(pi) is 0, not 1.2e-16
+        return _check_size(result)
+    raise _Reject(f"unsupported: {type(node).__name__}")
+
+
+def format_number(value) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.{SIG_DIGITS}g}"
+
+
+def evaluate(query: str) -> Optional[str]:
+    """Returns the formatted result, or None if the query isn't plain arithmetic we can do safely."""
+    expr = _prepare(query)
+    if expr is None:
+        return None
+    try:
+        tree = ast.parse(expr, mode="eval")
+        if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+            return None
+        # A bare number or constant isn't a calculation; let Wolfram say something more interesting about it
+        body = tree.body.operand if isinstance(tree.body, ast.UnaryOp) else tree.body
+        if isinstance(body, (ast.Constant, ast.Name)):
+            return None
+        return format_number(_eval(tree))
+    except (_Reject, SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError, ArithmeticError):
+        return None
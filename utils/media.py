@@ -0,0 +1,342 @@
+# utils/media.py: yt-dlp probing, format selection and download for /download, /audio and /separate.
+# One in-process extract_info call (in a worker thread) lists every format with its size or bitrate, so the best
+# format that fits the upload limit is picked before anything is fetched, over-long media is turned away up front,
+# and the chosen format is downloaded exactly once from the saved info (no second extraction), either to disk or
+# piped straight into the encoder when it has to be compressed anyway.
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import yt_dlp
+from yt_dlp.utils import sanitize_filename
+
+from utils.processes import process_runner
+from utils.transcode import MediaMeta, TranscodePlan, run_piped
+
+logger = logging.getLogger("FreesonaBot")
+
+MAX_DURATION       = int(os.getenv("DOWNLOAD_MAX_DURATION", 3 * 60 * 60))   # seconds, any mode
+BATCH_MAX_ITEMS    = int(os.getenv("DOWNLOAD_BATCH_MAX", 10))   # URLs or playlist entries per command
+MAX_HEIGHT         = 1080
+COMPRESS_HEIGHT    = 480       # when nothing fits, download this small and let ffmpeg squeeze it
+SIZE_HEADROOM      = 0.95      # estimates are estimates
+AUDIO_BITRATE      = 128_000   # bits/s given to the audio track when compressing
+MIN_VIDEO_BITRATE  = 100_000   # below this a compressed video isn't watchable
+MP3_MIN_BITRATE    = 64_000    # lowest MP3 we'll encode when the native stream doesn't fit
+MP3_BITRATES       = (320_000, 256_000, 192_000, 160_000, 128_000, 112_000, 96_000, 80_000, 64_000)
+COPYABLE_ACODECS   = ("mp4a", "aac", "opus", "mp3", "vorbis")    # play in Discord as-is once in an audio container
+
+OUTPUT_TEMPLATE = "%(uploader)s – %(title)s.%(ext)s"
+
+# Progress lines on stdout, one per update: "@@<downloaded bytes>/<total or estimate>"
+PROGRESS_PREFIX   = "@@"
+PROGRESS_TEMPLATE = f"download:{PROGRESS_PREFIX}%(progress.downloaded_bytes)s/%(progress.total_bytes,progress.total_bytes_estimate)s"
+
+_PROBE_OPTS = {
+    "quiet":          True,
+    "no_warnings":    True,
+    "noplaylist":     True,               # a video URL that also names a playlist is just the video
+    "extract_flat":   "in_playlist",      # playlists list their entries without extracting each one
+    "playlist_items": f"1:{BATCH_MAX_ITEMS}",
+    "skip_download":  True,
+    "logger":         logger,
+}
+
+
+class MediaRejected(RuntimeError):
+    """The media can't be delivered (too long, nothing fits); the message is shown to the user."""
+
+
+class PlaylistFound(Exception):
+    """The URL is a playlist; its entry URLs (at most BATCH_MAX_ITEMS) are to be fetched as a batch."""
+
+    def __init__(self, title: str, urls: list[str]):
+        super().__init__(f"Playlist {title!r} with {len(urls)} entries")
+        self.title = title
+        self.urls = urls
+
+
+@dataclass
+class FormatChoice:
+    spec: str                      # yt-dlp format spec, e.g. "137+140"
+    height: Optional[int]
+    est_bytes: Optional[int]
+    compress: bool = False         # nothing fits the limit; expect compress_video afterwards
+    mp3_bitrate: Optional[int] = None   # audio only: encode to MP3 at this rate; None stream-copies the native codec
+
+
+# ---------------------------------------------------------------------------
+# Probe
+# ---------------------------------------------------------------------------
+
+def _extract(url: str) -> dict:
+    with yt_dlp.YoutubeDL(_PROBE_OPTS) as ydl:
+        info = ydl.extract_info(url, download=False)
+        if info.get("_type") == "playlist":
+            urls = [e.get("url") or e.get("webpage_url") for e in info.get("entries") or [] if e]
+            urls = [u for u in urls if u]
+            if not urls:
+                raise MediaRejected("The playlist is empty.")
+            if len(urls) > 1:
+                raise PlaylistFound(info.get("title") or "playlist", urls)
+            info = ydl.extract_info(urls[0], download=False)
+        return ydl.sanitize_info(info)
+
+
+async def probe(url: str) -> Optional[dict]:
+    """Full info dict for a URL, or None if yt-dlp can't extract it. Raises PlaylistFound for a playlist with
+    more than one entry."""
+    try:
+        return await asyncio.to_thread(_extract, url)
+    except (MediaRejected, PlaylistFound):
+        raise
+    except Exception as e:
+        logger.warning(f"yt-dlp probe failed for {url}: {e}")
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Selection
+# ---------------------------------------------------------------------------
+
+def estimate_size(fmt: dict, duration: Optional[float]) -> Optional[int]:
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    tbr = fmt.get("tbr") or fmt.get("abr")    # kbit/s
+    if tbr and duration:
+        return int(tbr * 1000 / 8 * duration)
+    return None
+
+
+def _has_video(fmt: dict) -> bool:
+    return fmt.get("vcodec") != "none"
+
+
+def _has_audio(fmt: dict) -> bool:
+    return fmt.get("acodec") != "none"
+
+
+def _best_audio(formats: list[dict]) -> Optional[dict]:
+    audio = [f for f in formats if _has_audio(f) and not _has_video(f)]
+    # m4a merges into mp4 without surprises; otherwise the highest bitrate
+    return max(audio, key=lambda f: (f.get("ext") == "m4a", f.get("abr") or f.get("tbr") or 0), default=None)
+
+
+def _sum(*sizes: Optional[int]) -> Optional[int]:
+    return None if any(s is None for s in sizes) else sum(sizes)
+
+
+def check_duration(info: dict) -> None:
+    duration = info.get("duration")
+    if duration and duration > MAX_DURATION:
+        raise MediaRejected(f"Longer than {MAX_DURATION // 60} minutes.")
+
+
+def select_video(info: dict, limit: Optional[int]) -> FormatChoice:
+    """Best format up to MAX_HEIGHT whose size fits `limit`; failing that, a small one to compress."""
+    check_duration(info)
+    duration = info.get("duration")
+    formats = [f for f in info.get("formats") or [info] if f.get("format_id") and (_has_video(f) or _has_audio(f))]
+    audio = _best_audio(formats)
+    audio_size = estimate_size(audio, duration) if audio else None
+
+    candidates: list[tuple[tuple, FormatChoice]] = []
+    for f in formats:
+        if not _has_video(f):
+            continue
+        height = f.get("height")
+        if height and height > MAX_HEIGHT:
+            continue
+        size = estimate_size(f, duration)
+        if _has_audio(f):
+            choice = FormatChoice(f["format_id"], height, size)
+        elif audio is not None:
+            choice = FormatChoice(f"{f['format_id']}+{audio['format_id']}", height, _sum(size, audio_size))
+        else:
+            continue
+        # Quality order: resolution, then mp4 (plays inline everywhere), then bitrate
+        candidates.append(((height or 0, f.get("ext") == "mp4", f.get("tbr") or 0), choice))
+
+    if not candidates:
+        raise MediaRejected("No downloadable video format.")
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    if limit is None:
+        return candidates[0][1]
+
+    budget = limit * SIZE_HEADROOM
+    for _, choice in candidates:
+        if choice.est_bytes is not None and choice.est_bytes <= budget:
+            return choice
+
+    # Nothing is known to fit: compression has to get it under the limit, which needs a minimum bitrate
+    if duration and limit * 8 / duration < MIN_VIDEO_BITRATE + AUDIO_BITRATE:
+        raise MediaRejected(f"Too long to fit under {limit / (1024 * 1024):.0f} MB.")
+    small = [c for _, c in candidates if (c.height or 0) <= COMPRESS_HEIGHT] or [candidates[-1][1]]
+    choice = small[0]
+    choice.compress = True
+    return choice
+
+
+def _audio_bitrate(fmt: dict) -> Optional[float]:
+    rate = fmt.get("abr") or (fmt.get("tbr") if not _has_video(fmt) else None)
+    return rate * 1000 if rate else None
+
+
+def select_audio(info: dict, limit: Optional[int]) -> FormatChoice:
+    """Best native audio stream that fits `limit`, stream-copied into an audio container. Only when none fits is
+    the best one transcoded to MP3, at the highest standard bitrate the size budget allows for the duration."""
+    check_duration(info)
+    duration = info.get("duration")
+    formats = [f for f in info.get("formats") or [info] if f.get("format_id") and _has_audio(f)]
+    if not formats:
+        raise MediaRejected("No audio stream.")
+    audio_only = [f for f in formats if not _has_video(f)]
+
+    def native_size(f: dict) -> Optional[int]:
+        # For muxed files only the audio track is kept
+        if not _has_video(f):
+            return estimate_size(f, duration)
+        rate = _audio_bitrate(f)
+        return int(rate / 8 * duration) if rate and duration else None
+
+    # Quality order: bitrate, then m4a (AAC plays everywhere); muxed files are the fallback for progressive-only sites
+    ranked = sorted(audio_only, key=lambda f: (_audio_bitrate(f) or 0, f.get("ext") == "m4a"), reverse=True)
+    ranked += sorted((f for f in formats if _has_video(f)), key=lambda f: estimate_size(f, duration) or float("inf"))
+    copyable = [f for f in ranked if (f.get("acodec") or "").split(".")[0] in COPYABLE_ACODECS]
+
+    budget = limit * SIZE_HEADROOM if limit is not None else None
+    for f in copyable:
+        size = native_size(f)
+        if budget is None or (size is not None and size <= budget):
+            return FormatChoice(f["format_id"], None, size)
+
+    # Nothing native is known to fit: encode the best source down to what the budget allows
+    source = ranked[0]
+    if budget is None or not duration:
+        return FormatChoice(source["format_id"], None, native_size(source), mp3_bitrate=128_000)
+    affordable = budget * 8 / duration
+    source_rate = _audio_bitrate(source) or MP3_BITRATES[0]
+    rate = next((r for r in MP3_BITRATES if r <= affordable and r <= max(source_rate, MP3_MIN_BITRATE)), None)
+    if rate is None:
+        raise MediaRejected(f"Too long to fit under {limit / (1024 * 1024):.0f} MB as audio.")
+    return FormatChoice(source["format_id"], None, int(rate / 8 * duration), mp3_bitrate=rate)
+
+
+# ---------------------------------------------------------------------------
+# Download
+# ---------------------------------------------------------------------------
+
+async def download(
+    info: dict,
+    choice: FormatChoice,
+    out_dir: str,
+    *,
+    audio: bool,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> Optional[str]:
+    """Downloads the chosen format from the probed info (no re-extraction). Returns the final file path or None.
+    `on_progress` gets the downloaded fraction (0..1) as yt-dlp reports it."""
+    info_path = os.path.join(out_dir, ".info.json")
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+
+    cmd = [
+        "yt-dlp", "--load-info-json", info_path, "-f", choice.spec,
+        "-o", os.path.join(out_dir, OUTPUT_TEMPLATE),
+        "--print", "after_move:filepath", "--no-simulate",
+        "--progress", "--newline", "--progress-template", PROGRESS_TEMPLATE,
+    ]
+    if audio and choice.mp3_bitrate:
+        cmd += ["-x", "--audio-format", "mp3", "--audio-quality", f"{choice.mp3_bitrate // 1000}K"]
+    elif audio:
+        cmd += ["-x", "--audio-format", "best"]     # stream copy: AAC -> .m4a, Opus -> .opus, MP3 as is
+    else:
+        cmd += [
+            "--merge-output-format", "mp4",
+            "--audio-multistreams",                        # Allow multiple audio streams during merge
+            "--postprocessor-args", "ffmpeg:-c:a aac",    # Re-encode audio to AAC to ensure compatibility
+        ]
+
+    # A merged download is two files, each reporting 0..100%; the bar restarts rather than lying about the total
+    path = ""
+    try:
+        async with process_runner.spawn(cmd) as proc:
+            async for raw in proc.stdout:
+                line = raw.decode(errors="replace").strip()
+                if not line.startswith(PROGRESS_PREFIX):
+                    if line:
+                        path = line
+                    continue
+                if on_progress is not None:
+                    done, _, total = line[len(PROGRESS_PREFIX):].partition("/")
+                    try:
+                        on_progress(float(done) / float(total))
+                    except (ValueError, ZeroDivisionError):
+                        pass    # "NA" when the size isn't known
+            await proc.wait()
+    finally:
+        os.remove(info_path)
+    if proc.returncode != 0:
+        logger.warning(f"yt-dlp download failed ({proc.returncode}): {proc.stderr_tail()[-300:]}")
+        return None
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        logger.warning(f"yt-dlp reported {path!r} but left no usable file")
+        return None
+    if audio and path.endswith(".opus"):
+        # Same Ogg container, but .ogg is the extension Discord's audio player recognises
+        os.replace(path, path[:-len(".opus")] + ".ogg")
+        path = path[:-len(".opus")] + ".ogg"
+    return path
+
+
+def stream_meta(info: dict, choice: FormatChoice) -> Optional[MediaMeta]:
+    """What the encoder will receive for `choice`, from the probe alone (for planning a piped encode)."""
+    by_id = {f.get("format_id"): f for f in info.get("formats") or [info]}
+    picked = [by_id[i] for i in choice.spec.split("+") if i in by_id]
+    video = next((f for f in picked if _has_video(f)), None)
+    audio = next((f for f in picked if _has_audio(f)), None)
+    duration = info.get("duration")
+    if video is None or not duration:
+        return None
+    return MediaMeta(
+        duration=float(duration),
+        size=choice.est_bytes or 0,
+        container="",
+        vcodec=video.get("vcodec"),
+        acodec=(audio.get("acodec") or "unknown") if audio else None,
+        width=int(video.get("width") or 0),
+        height=int(video.get("height") or 0),
+        fps=float(video.get("fps") or 30),
+    )
+
+
+async def stream_download(
+    info: dict,
+    choice: FormatChoice,
+    out_dir: str,
+    plan: TranscodePlan,
+    meta: MediaMeta,
+    *,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> Optional[str]:
+    """Pipes the chosen format from yt-dlp into ffmpeg, which writes the only file: the compressed mp4.
+    Returns its path or None. `on_progress` follows the encoder, which is never ahead of the download."""
+    info_path = os.path.join(out_dir, ".info.json")
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+
+    # yt-dlp's ffmpeg downloader merges video+audio on the fly; Matroska streams anything it can be handed
+    cmd = [
+        "yt-dlp", "--load-info-json", info_path, "-f", choice.spec, "-o", "-",
+        "--downloader", "ffmpeg", "--downloader-args", "ffmpeg_o:-f matroska", "--no-progress",
+    ]
+    name = sanitize_filename(f"{info.get('uploader') or 'NA'} – {info.get('title') or info.get('id')}") + ".mp4"
+    try:
+        return await run_piped(plan, meta, cmd, os.path.join(out_dir, name), on_progress=on_progress)
+    finally:
+        os.remove(info_path)
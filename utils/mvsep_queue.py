@@ -0,0 +1,110 @@
+# utils/mvsep_queue.py: Persistent FIFO queue for /separate jobs.
+# Each job is a row: where to report (channel and status message), who asked, what to separate and, once MVSEP
+# has accepted it, the job hash. Rows outlive restarts, so jobs submitted before one are polled again instead of
+# lost and jobs still waiting keep their place. Finished jobs are deleted; the results live on MVSEP.
+
+import os
+import time
+import sqlite3
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger("FreesonaBot")
+
+MVSEP_QUEUE_PATH = os.getenv("MVSEP_QUEUE_FILE", "mvsep_queue.db")
+
+_COLUMNS = "id, state, channel_id, message_id, requester_id, kind, source, filename, job_hash, created, submitted"
+
+
+@dataclass
+class SepJob:
+    id: int
+    state: str                      # "queued" -> "submitting" -> "polling", then the row is deleted
+    channel_id: int
+    message_id: int                 # the status message edited with progress and the result
+    requester_id: int
+    kind: str                       # "url" (platform or direct audio link) or "attachment"
+    source: str                     # the link, or the Discord attachment URL
+    filename: Optional[str]         # attachments only
+    job_hash: Optional[str]         # set once MVSEP accepted the job
+    created: float
+    submitted: Optional[float]
+
+
+class MVSepQueue:
+    def __init__(self, path: str = MVSEP_QUEUE_PATH):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, state TEXT NOT NULL,"
+                " channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL, requester_id INTEGER NOT NULL,"
+                " kind TEXT NOT NULL, source TEXT NOT NULL, filename TEXT,"
+                " job_hash TEXT, created REAL NOT NULL, submitted REAL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _select(self, where: str, params: tuple = ()) -> list[SepJob]:
+        rows = self.db.execute(f"SELECT {_COLUMNS} FROM jobs WHERE {where} ORDER BY id", params).fetchall()
+        return [SepJob(*row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Queue
+    # ------------------------------------------------------------------
+
+    def add(self, *, channel_id: int, message_id: int, requester_id: int, kind: str, source: str,
+            filename: Optional[str] = None) -> SepJob:
+        cur = self.db.execute(
+            "INSERT INTO jobs (state, channel_id, message_id, requester_id, kind, source, filename, created)"
+            " VALUES ('queued', ?, ?, ?, ?, ?, ?, ?)",
+            (channel_id, message_id, requester_id, kind, source, filename, time.time()),
+        )
+        self.db.commit()
+        return self._select("id = ?", (cur.lastrowid,))[0]
+
+    def queued(self) -> list[SepJob]:
+        """Jobs waiting for a slot, oldest first."""
+        return self._select("state = 'queued'")
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def set_state(self, job_id: int, state: str) -> None:
+        self.db.execute("UPDATE jobs SET state = ? WHERE id = ?", (state, job_id))
+        self.db.commit()
+
+    def set_submitted(self, job_id: int, job_hash: str) -> None:
+        self.db.execute(
+            "UPDATE jobs SET state = 'polling', job_hash = ?, submitted = ? WHERE id = ?",
+            (job_hash, time.time(), job_id),
+        )
+        self.db.commit()
+
+    def remove(self, job_id: int) -> None:
+        self.db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self.db.commit()
+
+    def recover(self) -> list[SepJob]:
+        """After a restart: jobs cut off mid-submission go back in line (their input was in a temp dir that's
+        gone), and the jobs MVSEP already accepted are returned so their polling can resume."""
+        self.db.execute("UPDATE jobs SET state = 'queued' WHERE state = 'submitting'")
+        self.db.commit()
+        return self._select("state = 'polling'")
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+mvsep_queue = MVSepQueue()
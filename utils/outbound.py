@@ -0,0 +1,52 @@
+# utils/outbound.py: Per-channel outbound scheduling for multi-message replies.
+# Replies to the same channel are sent one whole reply at a time (no interleaved segments), paced by a token bucket
+# that mirrors Discord's per-channel message route limit so we wait locally instead of eating 429s.
+
+import asyncio
+import time
+from typing import Optional
+
+# Discord's create-message route allows 5 messages per 5 seconds per channel
+BUCKET_CAPACITY = 5
+BUCKET_WINDOW   = 5.0
+
+SEND_MODES = ("natural", "fast")  # natural: simulated typing delays; fast: as fast as the bucket allows
+
+
+class TokenBucket:
+    def __init__(self, capacity: int = BUCKET_CAPACITY, window: float = BUCKET_WINDOW):
+        self.capacity = capacity
+        self.rate     = capacity / window  # tokens per second
+        self.tokens   = float(capacity)
+        self.updated  = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens  = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self) -> None:
+        self._refill()
+        if self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+
+class ChannelOutbox:
+    def __init__(self):
+        self.lock   = asyncio.Lock()  # FIFO: whole replies go out in the order they were queued
+        self.bucket = TokenBucket()
+
+
+_outboxes: dict[int, ChannelOutbox] = {}
+
+
+def get_outbox(channel_id: int) -> ChannelOutbox:
+    if channel_id not in _outboxes:
+        _outboxes[channel_id] = ChannelOutbox()
+    return _outboxes[channel_id]
+
+
+def resolve_send_mode(mode: Optional[str]) -> str:
+    return mode if mode in SEND_MODES else "natural"
@@ -0,0 +1,188 @@
+# utils/pages.py: Fetches search result pages and picks the passages worth showing the model.
+# Pages are downloaded in parallel with byte and time caps, stripped to main text with the stdlib HTML parser,
+# split into passages and ranked against the query, so /search summarizes real content instead of titles.
+
+import asyncio
+import logging
+import math
+import re
+from collections import Counter
+from html.parser import HTMLParser
+from typing import Optional
+
+import aiohttp
+
+from utils.http_client import http_client
+
+logger = logging.getLogger("FreesonaBot")
+
+FETCH_TOP_N          = 4
+FETCH_CONCURRENCY    = 4
+FETCH_TIMEOUT        = aiohttp.ClientTimeout(total=4, sock_connect=2)
+FETCH_MAX_BYTES      = 512 * 1024
+FETCH_CHUNK_BYTES    = 64 * 1024
+
+PASSAGE_CHARS        = 500   # target passage size
+PASSAGE_MIN_CHARS    = 60    # shorter blocks are menus, captions, cookie banners...
+CONTEXT_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN      = 4     # rough, good enough for budgeting
+
+USER_AGENT = "Mozilla/5.0 (compatible; FreesonaBot/1.0)"
+
+_SKIP_TAGS  = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe", "template"}
+_BLOCK_TAGS = {"p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "td", "pre", "blockquote", "div", "section", "article", "dd", "dt", "br"}
+_WORD_RE    = re.compile(r"\w+")
+
+_fetch_slots = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text, breaking blocks at block-level tags and skipping boilerplate containers."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[str] = []
+        self._buf: list[str] = []
+        self._skip = 0
+
+    def _flush(self) -> None:
+        if self._buf:
+            block = " ".join("".join(self._buf).split())
+            if block:
+                self.blocks.append(block)
+            self._buf = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._buf.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_passages(html: str) -> list[str]:
+    """Main-text passages of roughly PASSAGE_CHARS, built from consecutive text blocks."""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.debug(f"HTML parse stopped early: {e}")
+
+    passages: list[str] = []
+    buf: list[str] = []
+    size = 0
+    for block in parser.blocks:
+        if len(block) < PASSAGE_MIN_CHARS:
+            continue
+        if buf and size + len(block) > PASSAGE_CHARS:
+            passages.append(" ".join(buf))
+            buf, size = [], 0
+        buf.append(block[:PASSAGE_CHARS * 2])
+        size += len(block)
+    if buf:
+        passages.append(" ".join(buf))
+    return passages
+
+
+# ---------------------------------------------------------------------------
+# Ranking
+# ---------------------------------------------------------------------------
+
+def _terms(text: str) -> list[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if len(w) > 1]
+
+
+def rank_passages(query: str, passages: list[tuple[str, str]]) -> list[tuple[float, str, str]]:
+    """BM25-style scoring of (link, passage) pairs against the query, best first."""
+    q_terms = set(_terms(query))
+    if not q_terms or not passages:
+        return []
+
+    docs = [Counter(_terms(p)) for _, p in passages]
+    n = len(docs)
+    avg_len = sum(sum(d.values()) for d in docs) / n or 1
+    df = {t: sum(1 for d in docs if t in d) for t in q_terms}
+
+    k1, b = 1.2, 0.75
+    scored = []
+    for (link, passage), doc in zip(passages, docs):
+        length = sum(doc.values())
+        score = 0.0
+        for t in q_terms:
+            tf = doc.get(t, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        if score > 0:
+            scored.append((score, link, passage))
+    scored.sort(key=lambda s: s[0], reverse=True)
+    return scored
+
+
+# ---------------------------------------------------------------------------
+# Fetching
+# ---------------------------------------------------------------------------
+
+async def fetch_page(url: str) -> Optional[str]:
+    """Downloads at most FETCH_MAX_BYTES of an HTML page, or None."""
+    async with _fetch_slots:
+        try:
+            async with http_client.session.get(
+                url, timeout=FETCH_TIMEOUT, headers={"User-Agent": USER_AGENT}, allow_redirects=True,
+            ) as resp:
+                if resp.status != 200 or "html" not in resp.headers.get("content-type", "").lower():
+                    return None
+                chunks: list[bytes] = []
+                size = 0
+                async for chunk in resp.content.iter_chunked(FETCH_CHUNK_BYTES):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= FETCH_MAX_BYTES:
+                        break
+                return b"".join(chunks)[:FETCH_MAX_BYTES].decode(resp.charset or "utf-8", errors="replace")
+        except Exception as e:
+            logger.info(f"Page fetch skipped for {url}: {type(e).__name__}")
+            return None
+
+
+async def top_passages(query: str, links: list[str], *, token_budget: int = CONTEXT_TOKEN_BUDGET) -> list[tuple[str, str]]:
+    """Fetches the first FETCH_TOP_N links in parallel; returns the best (link, passage) pairs within the budget."""
+    links = links[:FETCH_TOP_N]
+    pages = await asyncio.gather(*(fetch_page(link) for link in links))
+
+    fetched = [(link, html) for link, html in zip(links, pages) if html]
+    extracted = await asyncio.gather(*(asyncio.to_thread(extract_passages, html) for _, html in fetched))
+
+    candidates: list[tuple[str, str]] = []
+    for (link, _), passages in zip(fetched, extracted):
+        candidates.extend((link, p) for p in passages)
+
+    budget = token_budget * CHARS_PER_TOKEN
+    chosen: list[tuple[str, str]] = []
+    for _, link, passage in rank_passages(query, candidates):
+        if len(passage) > budget:
+            continue
+        chosen.append((link, passage))
+        budget -= len(passage)
+        if budget < PASSAGE_MIN_CHARS:
+            break
+    return chosen
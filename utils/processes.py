@@ -0,0 +1,252 @@
+# utils/processes.py: Managed runner for the media subprocesses (yt-dlp, ffmpeg, ffprobe).
+# Every child starts in its own process group at a lower CPU and I/O priority, so media work yields to the event
+# loop (and to chat) instead of competing with it. Each program has a concurrency cap and a wall-clock timeout;
+# a child that times out, or whose caller is cancelled, is killed together with anything it spawned (yt-dlp's own
+# ffmpeg included). stderr is kept as a bounded tail, and CPU time and peak RSS are sampled from /proc and logged.
+
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from utils.jobs import DOWNLOAD_WORKERS, TRANSCODE_WORKERS
+
+logger = logging.getLogger("FreesonaBot")
+
+_CPUS = os.cpu_count() or 1
+
+PROC_NICE         = int(os.getenv("PROC_NICE", 10))                  # 0-19; higher yields more CPU to the bot
+DOWNLOAD_TIMEOUT  = int(os.getenv("DOWNLOAD_TIMEOUT", 30 * 60))      # seconds per yt-dlp run
+TRANSCODE_TIMEOUT = int(os.getenv("TRANSCODE_TIMEOUT", 60 * 60))     # seconds per ffmpeg run
+PROBE_TIMEOUT     = 60
+KILL_GRACE        = 5.0           # seconds between SIGTERM and SIGKILL
+STDERR_TAIL       = 64 * 1024     # bytes of stderr kept for the logs
+SAMPLE_INTERVAL   = 1.0           # seconds between CPU/RSS samples
+
+# Per program: how many may run at once, and for how long
+LIMITS   = {"yt-dlp": DOWNLOAD_WORKERS, "ffmpeg": TRANSCODE_WORKERS, "ffprobe": _CPUS}
+TIMEOUTS = {"yt-dlp": DOWNLOAD_TIMEOUT, "ffmpeg": TRANSCODE_TIMEOUT, "ffprobe": PROBE_TIMEOUT}
+
+_POSIX = os.name == "posix"
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if _POSIX else 100
+_PAGE = os.sysconf("SC_PAGE_SIZE") if _POSIX else 4096
+
+
+def _priority_prefix() -> list[str]:
+    # nice and ionice exec the real program, so the pid (and process group) stays the child's own
+    prefix = []
+    if PROC_NICE and shutil.which("nice"):
+        prefix += ["nice", "-n", str(PROC_NICE)]
+    if shutil.which("ionice"):
+        prefix += ["ionice", "-t", "-c", "2", "-n", "7"]    # best effort, lowest level; -t: run anyway if refused
+    return prefix
+
+
+_PREFIX = _priority_prefix() if _POSIX else []
+
+
+@dataclass
+class ProcUsage:
+    wall: float
+    cpu: Optional[float] = None         # seconds, the whole process tree; None where /proc isn't available
+    peak_rss: Optional[int] = None      # bytes, largest sampled tree total
+
+    def describe(self) -> str:
+        text = f"{self.wall:.1f}s"
+        if self.cpu is not None:
+            text += f", cpu {self.cpu:.1f}s"
+        if self.peak_rss is not None:
+            text += f", rss {self.peak_rss / (1024 * 1024):.0f}MB"
+        return text
+
+
+# ---------------------------------------------------------------------------
+# /proc sampling
+# ---------------------------------------------------------------------------
+
+def _tree(pid: int) -> list[int]:
+    pids, i = [pid], 0
+    while i < len(pids):
+        try:
+            with open(f"/proc/{pids[i]}/task/{pids[i]}/children") as f:
+                pids += [int(p) for p in f.read().split()]
+        except OSError:
+            pass
+        i += 1
+    return pids
+
+
+def _sample(pid: int) -> Optional[tuple[float, int]]:
+    """(CPU seconds, RSS bytes) of the tree under `pid`. CPU includes children already reaped."""
+    cpu, rss, seen = 0.0, 0, False
+    for p in _tree(pid):
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        seen = True
+        # utime stime cutime cstime, then rss (pages) further on
+        cpu += sum(int(v) for v in fields[11:15]) / _CLK_TCK
+        rss += int(fields[21]) * _PAGE
+    return (cpu, rss) if seen else None
+
+
+# ---------------------------------------------------------------------------
+# Managed process
+# ---------------------------------------------------------------------------
+
+class ManagedProcess:
+    def __init__(self, proc: asyncio.subprocess.Process, name: str, timeout: Optional[float]):
+        self.proc      = proc
+        self.name      = name
+        self.timeout   = timeout
+        self.timed_out = False
+        self.started   = time.perf_counter()
+        self._cpu: Optional[float] = None
+        self._rss: Optional[int] = None
+        self._stderr   = bytearray()
+        self._drainer  = asyncio.create_task(self._drain_stderr())
+        self._sampling = asyncio.create_task(self._sampler()) if _POSIX else None
+        self._deadline = (asyncio.get_running_loop().call_later(timeout, self._expire)
+                          if timeout else None)
+
+    @property
+    def stdout(self) -> Optional[asyncio.StreamReader]:
+        return self.proc.stdout
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.proc.returncode
+
+    async def wait(self) -> int:
+        return await self.proc.wait()
+
+    def stderr_tail(self) -> str:
+        return self._stderr.decode(errors="replace")
+
+    def usage(self) -> ProcUsage:
+        return ProcUsage(time.perf_counter() - self.started, self._cpu, self._rss)
+
+    async def _drain_stderr(self) -> None:
+        # Read continuously (a full pipe would stall the child) but keep only the tail
+        while chunk := await self.proc.stderr.read(65536):
+            self._stderr += chunk
+            del self._stderr[:-STDERR_TAIL]
+
+    async def _sampler(self) -> None:
+        while self.proc.returncode is None:
+            sample = _sample(self.proc.pid)
+            if sample is not None:
+                self._cpu = max(self._cpu or 0.0, sample[0])
+                self._rss = max(self._rss or 0, sample[1])
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    def _expire(self) -> None:
+        if self.proc.returncode is None:
+            self.timed_out = True
+            logger.warning(f"{self.name} timed out after {self.timeout:.0f}s, killing it")
+            self.signal(signal.SIGTERM)
+            asyncio.get_running_loop().call_later(KILL_GRACE, self.signal, signal.SIGKILL)
+
+    def signal(self, sig: int) -> None:
+        """Sends `sig` to the whole process group, falling back to the child alone."""
+        try:
+            if _POSIX:
+                os.killpg(self.proc.pid, sig)
+            elif self.proc.returncode is None:
+                self.proc.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def close(self) -> None:
+        """Kills what's still running, reaps it and stops the helpers."""
+        if self.proc.returncode is None:
+            self.signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(asyncio.shield(self.proc.wait()), KILL_GRACE)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.signal(signal.SIGKILL)
+            await self.proc.wait()
+        if self._deadline is not None:
+            self._deadline.cancel()
+        # stderr finishes draining once the group is gone and the pipe closes; the sampler just stops
+        if self._sampling is not None:
+            self._sampling.cancel()
+        await asyncio.gather(self._drainer, *filter(None, [self._sampling]), return_exceptions=True)
+
+
+class ProcessRunner:
+    def __init__(self, limits: dict[str, int] = LIMITS, timeouts: dict[str, int] = TIMEOUTS):
+        self.timeouts = timeouts
+        self._slots   = {name: asyncio.Semaphore(n) for name, n in limits.items()}
+        self.running: set[ManagedProcess] = set()
+        self.runs     = 0
+        self.failed   = 0
+        self.timeouts_hit = 0
+        self.cpu_seconds  = 0.0
+
+    @asynccontextmanager
+    async def spawn(self, cmd: list[str], *, timeout: Optional[float] = None, stdin=None,
+                    stdout=asyncio.subprocess.PIPE):
+        """Starts `cmd` once a slot for its program is free and yields the ManagedProcess. Leaving the block
+        (normally, on error or on cancellation) kills whatever is still running. `timeout` defaults per program."""
+        name = os.path.basename(cmd[0])
+        slot = self._slots.get(name)
+        if slot is not None:
+            await slot.acquire()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *_PREFIX, *cmd, stdin=stdin, stdout=stdout, stderr=asyncio.subprocess.PIPE,
+                start_new_session=_POSIX,
+            )
+            managed = ManagedProcess(proc, name, timeout or self.timeouts.get(name))
+            self.running.add(managed)
+            try:
+                yield managed
+            finally:
+                await managed.close()
+                self.running.discard(managed)
+                self._record(managed)
+        finally:
+            if slot is not None:
+                slot.release()
+
+    async def run(self, cmd: list[str], *, timeout: Optional[float] = None) -> tuple[int, bytes, str]:
+        """Runs `cmd` to completion: (exit code, stdout, stderr tail)."""
+        async with self.spawn(cmd, timeout=timeout) as proc:
+            stdout = await proc.stdout.read()
+            code = await proc.wait()
+        return code, stdout, proc.stderr_tail()
+
+    def _record(self, proc: ManagedProcess) -> None:
+        usage = proc.usage()
+        self.runs += 1
+        self.failed += proc.returncode != 0
+        self.timeouts_hit += proc.timed_out
+        self.cpu_seconds += usage.cpu or 0.0
+        logger.info(f"{proc.name} exited {proc.returncode} ({usage.describe()})")
+
+    def kill_all(self) -> None:
+        """SIGKILLs every running group (cog unload / shutdown)."""
+        for proc in list(self.running):
+            proc.signal(signal.SIGKILL)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self.running),
+            "runs": self.runs,
+            "failed": self.failed,
+            "timeouts": self.timeouts_hit,
+            "cpu_seconds": self.cpu_seconds,
+        }
+
+
+process_runner = ProcessRunner()
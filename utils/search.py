@@ -1,28 +1,153 @@
 # utils/search.py: Google Custom Search integration.
+# Results are cached on a normalized query so repeated searches cost no API quota; empty and failed lookups are
+# cached briefly too. Set SEARCH_CACHE_FILE to keep the cache across restarts.
 
 import os
+import json
+import time
 import logging
+from collections import OrderedDict
+from typing import Optional
+
 import aiohttp
 
+from utils.http_client import http_client
+from utils.pages import top_passages
+
 logger = logging.getLogger("FreesonaBot")
 
 GOOGLE_SEARCH_API_KEY = os.getenv("GOOGLE_SEARCH_API_KEY")
 SEARCH_ENGINE_ID      = os.getenv("SEARCH_ENGINE_ID")
+SEARCH_CACHE_PATH     = os.getenv("SEARCH_CACHE_FILE")  # optional on-disk tier
 
+SEARCH_CACHE_TTL          = int(os.getenv("SEARCH_CACHE_TTL", 6 * 60 * 60))
+SEARCH_CACHE_NEGATIVE_TTL = 5 * 60
+SEARCH_CACHE_MAX_ENTRIES  = 500
+
+# Sentence punctuation around words; symbols that change a query's meaning (c++, c#, node.js, tcp/ip, e-mail) stay
+_EDGE_PUNCT = "?!.,;:'\"()[]{}<>«»“”‘’…"
+
+
+def normalize_query(query: str) -> str:
+    """'  What is  Python?? ' and 'what is python' share a cache entry; 'c++ tutorial' and 'c tutorial' don't."""
+    words = (word.strip(_EDGE_PUNCT) for word in query.lower().split())
+    return " ".join(word for word in words if word)
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+class SearchCache:
+    def __init__(self, path: Optional[str] = None, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.path        = path
+        self.max_entries = max_entries
+        self.hits        = 0
+        self.misses      = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()  # key -> {"expires": float, "items": list | None}
+        self._loaded = False
+
+    def _load(self) -> None:
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            now = time.time()
+            for key, entry in data.items():
+                if entry.get("expires", 0) > now:
+                    self._entries[key] = entry
+        except Exception as e:
+            logger.warning(f"Search cache load failed: {e}")
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning(f"Search cache save failed: {e}")
+
+    def get(self, key: str) -> tuple[bool, Optional[list]]:
+        """Returns (found, items). items is None for a cached failure."""
+        if not self._loaded:
+            self._load()
+        entry = self._entries.get(key)
+        if entry is None or entry["expires"] <= time.time():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry["items"]
+
+    def put(self, key: str, items: Optional[list]) -> None:
+        ttl = SEARCH_CACHE_TTL if items else SEARCH_CACHE_NEGATIVE_TTL
+        self._entries[key] = {"expires": time.time() + ttl, "items": items}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._save()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries":  len(self._entries),
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+search_cache = SearchCache(SEARCH_CACHE_PATH)
+
+# ---------------------------------------------------------------------------
+# Lookup
+# ---------------------------------------------------------------------------
+
+async def search_items(query: str) -> Optional[list[dict]]:
+    """Returns [{"title", "link", "snippet"}, ...], [] for no results, or None on failure."""
+    key = normalize_query(query)
+    found, items = search_cache.get(key)
+    if found:
+        return items
 
-async def web_search(query: str) -> str:
-    if not GOOGLE_SEARCH_API_KEY or not SEARCH_ENGINE_ID:
-        return "Search not configured."
     url = "https://www.googleapis.com/customsearch/v1"
     params = {"key": GOOGLE_SEARCH_API_KEY, "cx": SEARCH_ENGINE_ID, "q": query, "num": 5}
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-            async with session.get(url, params=params) as resp:
-                data = await resp.json()
-        items = data.get("items", [])
-        if not items:
-            return "No results."
-        return "\n".join(f"- {i['title']} ({i['link']})" for i in items)
+        async with http_client.session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            data = await resp.json()
+        if "error" in data:
+            raise RuntimeError(data["error"].get("message", "API error"))
+        items = [
+            {"title": i.get("title", ""), "link": i.get("link", ""), "snippet": i.get("snippet", "")}
+            for i in data.get("items", [])
+        ]
     except Exception as e:
         logger.error(f"Search error: {e}")
-        return "Search failed."
\ No newline at end of file
+        items = None
+
+    search_cache.put(key, items)
+    return items
+
+
+async def search_context(query: str) -> str:
+    """Result list plus the best-ranked passages from the top result pages, for the /search prompt."""
+    if not GOOGLE_SEARCH_API_KEY or not SEARCH_ENGINE_ID:
+        return "Search not configured."
+    items = await search_items(query)
+    if items is None:
+        return "Search failed."
+    if not items:
+        return "No results."
+
+    lines = [f"- {i['title']} ({i['link']}): {i['snippet']}" for i in items]
+    passages = await top_passages(query, [i["link"] for i in items if i["link"]])
+    if passages:
+        lines.append("\nExcerpts from the result pages:")
+        lines.extend(f"[{link}]\n{passage}" for link, passage in passages)
+    return "\n".join(lines)
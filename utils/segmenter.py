@@ -0,0 +1,219 @@
+# utils/segmenter.py: Discord-aware text segmenter.
+# Tokenizes a model reply once (code fences, paragraph breaks, sentence breaks) and packs the pieces into segments
+# that fit Discord's limits without splitting a fenced code block mid-fence or cutting through a link.
+
+import re
+from typing import Iterator
+
+DISCORD_MESSAGE_LIMIT = 2000
+DISCORD_EMBED_LIMIT   = 4096
+
+SPLIT_MIN_LENGTH = 280  # shorter replies are never split
+SPLIT_TARGET     = 220  # soft size for sentence-packed chunks of a single long paragraph
+
+FENCE = "```"
+
+# Block scan: code fences and paragraph breaks. A fence swallows everything up to its closing fence,
+# so blank lines inside code never count as paragraph breaks.
+_BLOCK_RE = re.compile(r"```.*?(?:```|\Z)|\n(?:[ \t]*\n)+\s*", re.S)
+_BREAK_RE = re.compile(r"\n(?:[ \t]*\n)+\s*")     # the same scan for text without fences: a literal-led search
+
+# Sentence breaks, only looked for in prose that actually needs packing. Group 1 is the break; matching the
+# punctuation itself (rather than a lookbehind) lets the engine skip ahead to candidates.
+_SENTENCE_RE = re.compile(r"[.!?](\s+)")
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer
+# ---------------------------------------------------------------------------
+
+class _Piece:
+    """A run of prose, a sentence or a whole code fence, with the whitespace that followed it."""
+    __slots__ = ("text", "sep", "code")
+
+    def __init__(self, text: str, sep: str = "", code: bool = False):
+        self.text = text
+        self.sep  = sep
+        self.code = code
+
+
+def tokenize(text: str) -> list[list[_Piece]]:
+    """Splits text into paragraphs of prose runs and code fences in a single scan."""
+    paragraphs: list[list[_Piece]] = []
+    current: list[_Piece] = []
+    pos = 0
+
+    if "\n" not in text and FENCE not in text:
+        return [[_Piece(text)]] if text else []     # a single line of prose is a single paragraph
+
+    for m in (_BLOCK_RE if FENCE in text else _BREAK_RE).finditer(text):
+        if m.start() > pos:
+            current.append(_Piece(text[pos:m.start()]))
+        if m.group().startswith(FENCE):
+            current.append(_Piece(m.group(), code=True))
+        elif current:
+            current[-1].sep = m.group()
+            paragraphs.append(current)
+            current = []
+        pos = m.end()
+
+    if pos < len(text):
+        current.append(_Piece(text[pos:]))
+    if current:
+        paragraphs.append(current)
+    return paragraphs
+
+
+def _sentences(piece: _Piece) -> Iterator[tuple[str, str, bool]]:
+    """Yields (text, separator, is_code); code fences are never split here."""
+    if piece.code:
+        yield piece.text, piece.sep, True
+        return
+    text, pos = piece.text, 0
+    for m in _SENTENCE_RE.finditer(text):
+        yield text[pos:m.start(1)], m.group(1), False
+        pos = m.end()
+    yield text[pos:], piece.sep, False
+
+
+# ---------------------------------------------------------------------------
+# Oversized pieces
+# ---------------------------------------------------------------------------
+
+def _split_prose(text: str, limit: int) -> Iterator[str]:
+    """Cuts at the last whitespace before the limit, so links and words stay whole."""
+    while len(text) > limit:
+        cut = max(text.rfind(" ", 0, limit + 1), text.rfind("\n", 0, limit + 1))
+        if cut <= 0:
+            cut = limit  # a single token longer than a whole message; nothing better to do
+        yield text[:cut].rstrip()
+        text = text[cut:].lstrip()
+    if text:
+        yield text
+
+
+def _split_fence(text: str, limit: int) -> Iterator[str]:
+    """Splits a code block by lines, closing and reopening the fence (with its language tag) on each chunk."""
+    header, newline, body = text.partition("\n")
+    if not newline or len(header) + len(FENCE) + 2 >= limit:
+        # A fence on one line (or an opening line too long to repeat) has no language tag worth keeping
+        header, body = FENCE, text[len(FENCE):]
+    if body.endswith(FENCE):
+        body = body[:-len(FENCE)]
+    body = body.rstrip("\n")
+
+    overhead = len(header) + len(FENCE) + 2  # header + "\n" ... "\n" + closing fence
+    room = max(limit - overhead, 1)
+
+    chunk: list[str] = []
+    size = 0
+    for line in body.split("\n"):
+        for part in ([line] if len(line) <= room else [line[i:i + room] for i in range(0, len(line), room)]):
+            if chunk and size + len(part) + 1 > room:
+                yield f"{header}\n" + "\n".join(chunk) + f"\n{FENCE}"
+                chunk, size = [], 0
+            chunk.append(part)
+            size += len(part) + 1
+    if chunk:
+        yield f"{header}\n" + "\n".join(chunk) + f"\n{FENCE}"
+
+
+def _fit(text: str, code: bool, limit: int) -> list[str]:
+    if len(text) <= limit:
+        return [text]
+    if code:
+        return list(_split_fence(text, limit))
+    return list(_split_prose(text, limit))
+
+
+# ---------------------------------------------------------------------------
+# Packing
+# ---------------------------------------------------------------------------
+
+def _pack(pieces: list[_Piece], size: int, limit: int) -> list[str]:
+    """Greedily packs sentences into chunks of about `size` chars, never exceeding `limit`."""
+    chunks: list[str] = []
+    buf: list[str] = []
+    length = 0   # chars in buf, not counting the separator waiting to join the next part
+    pending = ""
+
+    for piece in pieces:
+        for text, sep, code in _sentences(piece):
+            for part in (text,) if len(text) <= limit else _fit(text, code, limit):
+                if buf and (length + len(part) > size or length + len(pending) + len(part) > limit):
+                    chunks.append("".join(buf).strip())
+                    buf, length, pending = [], 0, ""
+                if buf:
+                    buf.append(pending)
+                    length += len(pending)
+                buf.append(part)
+                length += len(part)
+                pending = ""
+            pending = sep
+
+    if buf:
+        chunks.append("".join(buf).strip())
+    return chunks
+
+
+def _join(paragraph: list[_Piece]) -> str:
+    last = len(paragraph) - 1
+    return "".join(p.text + (p.sep if i < last else "") for i, p in enumerate(paragraph)).strip()
+
+
+def segment_text(text: str, *, limit: int = DISCORD_MESSAGE_LIMIT, pack: bool = False) -> list[str]:
+    """Splits a reply into Discord-sized segments.
+
+    pack=False (chat): each paragraph is its own segment; a single long paragraph is split into ~SPLIT_TARGET
+    sentence chunks. pack=True (embeds, long messages): paragraphs are packed together up to `limit`.
+    No segment is ever longer than `limit`.
+    """
+    if len(text) < SPLIT_MIN_LENGTH and not pack:
+        return [text]
+
+    paragraphs = tokenize(text)
+    if not paragraphs:
+        return [text] if text else []
+
+    if pack:
+        segments: list[str] = []
+        buf: list[str] = []
+        length = 0
+        for para in paragraphs:
+            joined = _join(para)
+            parts = [joined] if len(joined) <= limit else _pack(para, limit, limit)
+            for part in parts:
+                if buf and length + 2 + len(part) > limit:
+                    segments.append("\n\n".join(buf))
+                    buf, length = [], 0
+                buf.append(part)
+                length += len(part) + (2 if len(buf) > 1 else 0)
+        if buf:
+            segments.append("\n\n".join(buf))
+        return segments
+
+    if len(paragraphs) == 1:
+        chunks = _pack(paragraphs[0], min(SPLIT_TARGET, limit), limit)
+        return chunks if len(chunks) > 1 or len(text) > limit else [text]
+
+    segments = []
+    for para in paragraphs:
+        joined = _join(para)
+        if len(joined) <= limit:
+            segments.append(joined)
+        else:
+            segments.extend(_pack(para, limit, limit))
+    return segments
+
+
+def truncate_text(text: str, limit: int = 4000) -> str:
+    """Cuts text to `limit` at a sentence end when one is reasonably close, closing any code fence left open."""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    last_dot = cut.rfind('.')
+    if last_dot > 1000:
+        cut = cut[:last_dot + 1]
+    if cut.count(FENCE) % 2:
+        cut = cut[:limit - len(FENCE) - 1] + f"\n{FENCE}"
+    return cut
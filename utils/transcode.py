@@ -0,0 +1,265 @@
+# utils/transcode.py: Plans and runs the ffmpeg pass that makes an oversized video fit the upload limit.
+# The bitrate budget decides resolution and frame rate (starved pixels look worse than fewer, well-fed ones and
+# cost more CPU), two-pass ABR is used when the encode is short enough to afford it and a capped CRF otherwise,
+# and a file that only has the wrong container is remuxed with stream copy instead of re-encoded. Long encodes can
+# also read straight from the downloader through a pipe, so the full-size file never touches the disk.
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Callable, Optional
+
+from utils.processes import ManagedProcess, process_runner
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+logger = logging.getLogger("FreesonaBot")
+
+CONTAINER_OVERHEAD = 0.98        # mp4 muxing takes ~1-2% of the budget
+MIN_VIDEO_BITRATE  = 100_000     # below this a compressed video isn't watchable
+HEIGHT_LADDER      = (1080, 720, 576, 480, 360, 240)
+MIN_BPP            = 0.06        # bits per pixel per frame x264 needs to look decent at these sizes
+MAX_FPS_STARVED    = 30          # frame rate cap once the budget forces a smaller picture
+TWO_PASS_MAX_WORK  = 1280 * 720 * 30 * 300     # pixels encoded; ~5 minutes of 720p30
+CRF                = 23
+CRF_PRESET         = "veryfast"
+TWO_PASS_PRESET    = "faster"    # both passes; x264 speeds the first one up on its own
+PASS_SPLIT         = 0.35        # share of the progress bar given to the first pass
+PIPE_BUFFER        = 1024 * 1024 # downloader -> encoder pipe; absorbs network bursts while x264 catches up
+
+# Codecs an .mp4 can carry that Discord plays inline; anything else is re-encoded
+MP4_VIDEO_CODECS = {"h264", "hevc", "av1", "vp9"}
+MP4_AUDIO_CODECS = {"aac", "mp3", "opus"}
+
+
+@dataclass
+class MediaMeta:
+    duration: float
+    size: int
+    container: str                  # ffprobe format_name, e.g. "mov,mp4,m4a,3gp,3g2,mj2"
+    vcodec: Optional[str]
+    acodec: Optional[str]
+    width: int
+    height: int
+    fps: float
+
+
+@dataclass
+class TranscodePlan:
+    mode: str                       # "keep", "remux", "two_pass" or "crf"
+    height: Optional[int] = None    # None keeps the source size
+    fps: Optional[float] = None     # None keeps the source rate
+    video_bitrate: int = 0
+    audio_bitrate: int = 0
+
+    def describe(self) -> str:
+        if self.mode in ("keep", "remux"):
+            return self.mode
+        return (f"{self.mode} {self.height or 'src'}p@{self.fps or 'src'} "
+                f"v{self.video_bitrate // 1000}k a{self.audio_bitrate // 1000}k")
+
+
+# ---------------------------------------------------------------------------
+# Probe
+# ---------------------------------------------------------------------------
+
+async def probe_media(path: str) -> Optional[MediaMeta]:
+    _, stdout, _ = await process_runner.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+    )
+    try:
+        data = json.loads(stdout)
+        fmt = data["format"]
+        duration = float(fmt["duration"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    video = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), {})
+    audio = next((s for s in data.get("streams", []) if s.get("codec_type") == "audio"), {})
+    try:
+        fps = float(Fraction(video.get("avg_frame_rate") or "0/1"))
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+    return MediaMeta(
+        duration=duration,
+        size=int(fmt.get("size") or os.path.getsize(path)),
+        container=fmt.get("format_name", ""),
+        vcodec=video.get("codec_name"),
+        acodec=audio.get("codec_name"),
+        width=int(video.get("width") or 0),
+        height=int(video.get("height") or 0),
+        fps=fps or 30.0,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Plan
+# ---------------------------------------------------------------------------
+
+def _audio_bitrate(total: float) -> int:
+    if total >= 1_000_000:
+        return 128_000
+    if total >= 400_000:
+        return 96_000
+    return 64_000
+
+
+def _scaled_width(meta: MediaMeta, height: int) -> int:
+    if not meta.width or not meta.height:
+        return height * 16 // 9     # unknown (HLS/DASH formats often report only a height): assume 16:9
+    return round(meta.width * height / meta.height / 2) * 2
+
+
+def plan_transcode(meta: MediaMeta, target_bytes: int) -> Optional[TranscodePlan]:
+    """How to get `meta` under `target_bytes`, or None when it can't be done at a watchable bitrate."""
+    mp4_ready = meta.vcodec in MP4_VIDEO_CODECS and (meta.acodec is None or meta.acodec in MP4_AUDIO_CODECS)
+    if meta.size <= target_bytes:
+        if "mp4" in meta.container.split(",") or not mp4_ready:
+            return TranscodePlan("keep")
+        return TranscodePlan("remux")
+
+    return plan_encode(meta, target_bytes)
+
+
+def plan_encode(meta: MediaMeta, target_bytes: int, *, two_pass: bool = True) -> Optional[TranscodePlan]:
+    """Encode settings that fit `target_bytes`, or None when the bitrate would be unwatchable. `two_pass=False`
+    is for input that can only be read once (a pipe)."""
+    total = target_bytes * 8 * CONTAINER_OVERHEAD / meta.duration
+    audio = _audio_bitrate(total) if meta.acodec else 0
+    video = int(total - audio)
+    if video < MIN_VIDEO_BITRATE:
+        return None
+
+    # Largest picture (and then the highest frame rate) the budget feeds at MIN_BPP
+    src_height = meta.height or HEIGHT_LADDER[0]
+    heights = [h for h in HEIGHT_LADDER if h < src_height]
+    if src_height <= HEIGHT_LADDER[0]:
+        heights.insert(0, src_height)
+    rates = [meta.fps] if meta.fps <= MAX_FPS_STARVED else [meta.fps, MAX_FPS_STARVED]
+    height, fps = heights[-1], min(meta.fps, MAX_FPS_STARVED)
+    for h in heights:
+        w = _scaled_width(meta, h)
+        fit = next((r for r in rates if video / (w * h * r) >= MIN_BPP), None)
+        if fit is not None:
+            height, fps = h, fit
+            break
+
+    work = _scaled_width(meta, height) * height * fps * meta.duration
+    return TranscodePlan(
+        mode="two_pass" if two_pass and work <= TWO_PASS_MAX_WORK else "crf",
+        height=None if height == meta.height else height,
+        fps=None if fps == meta.fps else fps,
+        video_bitrate=video,
+        audio_bitrate=audio,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+def _ffmpeg_cmd(args: list[str]) -> list[str]:
+    return ["ffmpeg", "-y", "-hide_banner", "-nostats", "-progress", "pipe:1", *args]
+
+
+async def _watch_ffmpeg(proc: ManagedProcess, duration: float,
+                        on_progress: Optional[Callable[[float], None]], start: float = 0.0, span: float = 1.0) -> int:
+    """Follows ffmpeg's progress on stdout, mapping its position onto start..start+span. Returns the exit code."""
+    async for raw in proc.stdout:
+        key, _, value = raw.decode(errors="replace").strip().partition("=")
+        if key == "out_time_us" and on_progress is not None:
+            try:
+                on_progress(start + span * min(1.0, int(value) / 1_000_000 / duration))
+            except ValueError:
+                pass    # "N/A" before the first frame
+    await proc.wait()
+    if proc.returncode != 0:
+        logger.warning(f"ffmpeg failed ({proc.returncode}): {proc.stderr_tail()[-300:]}")
+    return proc.returncode
+
+
+async def _ffmpeg(args: list[str], duration: float, on_progress: Optional[Callable[[float], None]],
+                  start: float = 0.0, span: float = 1.0) -> int:
+    async with process_runner.spawn(_ffmpeg_cmd(args)) as proc:
+        return await _watch_ffmpeg(proc, duration, on_progress, start, span)
+
+
+def _encode_args(plan: TranscodePlan) -> tuple[list[str], list[str]]:
+    """(video, audio) encoder arguments for a two_pass or crf plan."""
+    filters = []
+    if plan.height:
+        filters.append(f"scale=-2:{plan.height}")
+    if plan.fps:
+        filters.append(f"fps={plan.fps:g}")
+    video = ["-c:v", "libx264", "-pix_fmt", "yuv420p"] + (["-vf", ",".join(filters)] if filters else [])
+    audio = ["-c:a", "aac", "-b:a", str(plan.audio_bitrate), "-ac", "2"] if plan.audio_bitrate else ["-an"]
+    return video, audio
+
+
+def _crf_args(plan: TranscodePlan, src: str, dst: str) -> list[str]:
+    # Quality-driven, with the bitrate capped so the size can't run past the budget
+    video, audio = _encode_args(plan)
+    return ["-i", src, *video, "-preset", CRF_PRESET, "-crf", str(CRF), "-maxrate", str(plan.video_bitrate),
+            "-bufsize", str(plan.video_bitrate * 2), *audio, "-movflags", "+faststart", dst]
+
+
+async def run_transcode(plan: TranscodePlan, meta: MediaMeta, src: str, dst: str,
+                        on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
+    """Executes `plan`, writing `dst`. Returns the path to deliver (`src` itself for "keep") or None on failure."""
+    if plan.mode == "keep":
+        return src
+
+    output = ["-movflags", "+faststart", dst]
+    if plan.mode == "remux":
+        code = await _ffmpeg(["-i", src, "-map", "0", "-c", "copy", *output], meta.duration, on_progress)
+    elif plan.mode == "crf":
+        code = await _ffmpeg(_crf_args(plan, src, dst), meta.duration, on_progress)
+    else:
+        video, audio = _encode_args(plan)
+        rate = str(plan.video_bitrate)
+        passlog = os.path.join(os.path.dirname(dst), ".ffpass")
+        first = ["-i", src, *video, "-preset", TWO_PASS_PRESET, "-b:v", rate,
+                 "-pass", "1", "-passlogfile", passlog, "-an", "-f", "null", os.devnull]
+        code = await _ffmpeg(first, meta.duration, on_progress, 0.0, PASS_SPLIT)
+        if code == 0:
+            second = ["-i", src, *video, "-preset", TWO_PASS_PRESET, "-b:v", rate,
+                      "-pass", "2", "-passlogfile", passlog, *audio, *output]
+            code = await _ffmpeg(second, meta.duration, on_progress, PASS_SPLIT, 1.0 - PASS_SPLIT)
+
+    return dst if code == 0 and os.path.exists(dst) else None
+
+
+async def run_piped(plan: TranscodePlan, meta: MediaMeta, source_cmd: list[str], dst: str,
+                    on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
+    """Encodes whatever `source_cmd` writes to stdout straight into `dst` with a single-pass (crf) plan.
+    Both processes share a kernel pipe, so the source blocks whenever the encoder falls behind (backpressure)
+    and only the encoder's output is ever written to disk. Returns `dst`, or None if either side failed."""
+    read_fd, write_fd = os.pipe()
+    try:
+        fcntl.fcntl(write_fd, fcntl.F_SETPIPE_SZ, PIPE_BUFFER)
+    except (AttributeError, OSError):
+        pass    # Linux-only; elsewhere the default pipe size still works
+    # The source is paced by the encoder, so both get the encoder's time limit
+    async with process_runner.spawn(source_cmd, stdout=write_fd, timeout=process_runner.timeouts["ffmpeg"]) as source:
+        try:
+            async with process_runner.spawn(_ffmpeg_cmd(_crf_args(plan, "pipe:0", dst)), stdin=read_fd) as encoder:
+                # The children hold their own copies; ours must go so EOF and broken pipes reach them
+                os.close(read_fd)
+                os.close(write_fd)
+                read_fd = write_fd = None
+                code = await _watch_ffmpeg(encoder, meta.duration, on_progress)
+        finally:
+            for fd in (read_fd, write_fd):
+                if fd is not None:
+                    os.close(fd)
+        await source.wait()
+    if source.returncode != 0:
+        # A source that dies mid-stream leaves a short but valid-looking file; it must not be delivered
+        logger.warning(f"Piped source failed ({source.returncode}): {source.stderr_tail()[-300:]}")
+        return None
+    return dst if code == 0 and os.path.exists(dst) else None
@@ -0,0 +1,133 @@
+# utils/wolfram_cache.py: Persistent cache for formatted Wolfram|Alpha answers.
+# Keyed on the normalized query plus unit system. Pure math never expires; currency, time and other
+# moving targets get short TTLs. Stores the already formatted embed text, so hits skip formatting too.
+
+import os
+import re
+import time
+import sqlite3
+import logging
+from typing import Optional
+
+from utils.wolfram_format import extract_result
+
+logger = logging.getLogger("FreesonaBot")
+
+WOLFRAM_CACHE_PATH = os.getenv("WOLFRAM_CACHE_FILE", "wolfram_cache.db")
+
+# TTL per query class, in seconds (None = never expires)
+CLASS_TTLS: dict[str, Optional[int]] = {
+    "math":     None,
+    "currency": 60 * 60,
+    "live":     60,             # clocks, dates, "now"
+    "volatile": 30 * 60,        # weather, stocks, populations...
+    "general":  7 * 24 * 60 * 60,
+}
+
+_CURRENCY_RE = re.compile(
+    r"\b(usd|eur|gbp|jpy|php|cny|inr|krw|aud|cad|chf|btc|eth|dollars?|euros?|pesos?|yen|pounds? sterling|exchange rate)\b"
+)
+_LIVE_RE     = re.compile(r"\b(time|now|today|tomorrow|yesterday|date|current|sunrise|sunset|moon phase)\b")
+_VOLATILE_RE = re.compile(r"\b(weather|forecast|temperature in|stock|price|market|population|news|score)\b")
+_MATH_WORDS  = {
+    "integrate", "integral", "derivative", "differentiate", "d/dx", "solve", "simplify", "factor", "expand",
+    "limit", "sum", "product", "sqrt", "sin", "cos", "tan", "log", "ln", "exp", "of", "from", "to", "x", "y", "z",
+    "dx", "dy", "for", "and", "plot", "roots", "zeros", "series", "inverse", "matrix", "determinant", "gcd", "lcm",
+    "mod", "pi", "e", "i", "is", "prime", "factorial", "wrt", "with", "respect",
+}
+_WORD_RE = re.compile(r"[a-z/]+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases, collapses whitespace and drops a trailing question mark or full stop. Everything else is
+    meaningful in math and stays: "!" is factorial, and a leading "." starts a decimal."""
+    return " ".join(query.lower().split()).rstrip(" ?.")
+
+
+def classify_query(normalized: str) -> str:
+    if _CURRENCY_RE.search(normalized):
+        return "currency"
+    if _LIVE_RE.search(normalized):
+        return "live"
+    if _VOLATILE_RE.search(normalized):
+        return "volatile"
+    if all(w in _MATH_WORDS for w in _WORD_RE.findall(normalized)):
+        return "math"
+    return "general"
+
+
+class WolframCache:
+    def __init__(self, path: str = WOLFRAM_CACHE_PATH):
+        self.path   = path
+        self.hits   = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, text TEXT NOT NULL, source TEXT NOT NULL,"
+                " class TEXT NOT NULL, created REAL NOT NULL, expires REAL, expr TEXT)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(results)")}
+            if "expr" not in columns:
+                self._db.execute("ALTER TABLE results ADD COLUMN expr TEXT")
+            self._db.commit()
+        return self._db
+
+    @staticmethod
+    def key(query: str, units: str = "metric") -> str:
+        return f"{units}|{normalize_query(query)}"
+
+    def get(self, query: str, units: str = "metric") -> Optional[tuple[str, Optional[str], str]]:
+        """Returns (formatted_text, result_expr, source) or None."""
+        try:
+            row = self.db.execute(
+                "SELECT text, source, expires, expr FROM results WHERE key = ?", (self.key(query, units),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Wolfram cache read failed: {e}")
+            return None
+        if row is None or (row[2] is not None and row[2] <= time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Rows from before expressions were stored get theirs from the text
+        return row[0], row[3] if row[3] is not None else extract_result(row[0]), row[1]
+
+    def put(self, query: str, text: str, expr: Optional[str], source: str, units: str = "metric") -> None:
+        normalized = normalize_query(query)
+        query_class = classify_query(normalized)
+        ttl = CLASS_TTLS[query_class]
+        now = time.time()
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results (key, text, source, class, created, expires, expr) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (f"{units}|{normalized}", text, source, query_class, now, now + ttl if ttl is not None else None, expr),
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Wolfram cache write failed: {e}")
+
+    def purge_expired(self) -> int:
+        try:
+            cur = self.db.execute("DELETE FROM results WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+            self.db.commit()
+            return cur.rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Wolfram cache purge failed: {e}")
+            return 0
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+wolfram_cache = WolframCache()
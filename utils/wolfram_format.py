@@ -0,0 +1,73 @@
+# utils/wolfram_format.py: Formats Wolfram|Alpha LLM API text for the /math embed.
+# Same rules and output as the original chain of re.sub calls, but the patterns are compiled once, each pass only
+# runs when the text contains what it looks for, and the result expression comes back with the text, so the
+# embed and the image renderer don't scan it again.
+
+import re
+from typing import Optional
+
+FOCUS_MARKER = "Input interpretation"
+NO_RESULT    = "No result found."
+
+_CODE_RE      = re.compile(r"(?i)Wolfram Language code:.*")
+_SITE_RE      = re.compile(r"(?i)Wolfram\s*\|\s*Alpha website result.*")
+_RESULT_RE    = re.compile(r"(?i)Result:\s*\n*(.+)")
+# The lookahead lets the scan skip, case-sensitively, every position that can't start a label (İ and ı are the
+# other letters IGNORECASE folds to p/i/u); a scoped (?i) at each position is what made this the slowest pass
+_LABEL_URL_RE = re.compile(r"(?=[PpIiUuİı])(?i:plot|image|url):\s*https?://\S+")
+_URL_RE       = re.compile(r"https?://\S+")
+_HEADER_RE    = re.compile(r"(?m)^([^:\n|]+)\s*\|\s*([^\n]+)")
+_GAP_RE       = re.compile(r"\n\s*\n")
+_EXPR_RE      = re.compile(r"\*\*Result:\*\*\s*`([^`]+)`")
+
+
+def format_wolfram_text(text: str) -> tuple[str, Optional[str]]:
+    """Returns (formatted_text, result_expression); the expression is None when there's no result to render."""
+    if not text:
+        return NO_RESULT, None
+
+    # Substring checks stand in for the case-insensitive patterns. Only exact for ASCII (re's IGNORECASE also
+    # folds a few non-ASCII letters), so anything else runs every pass.
+    folded = text.lower() if text.isascii() else None
+
+    def has(needle: str) -> bool:
+        return folded is None or needle in folded
+
+    # 1. Strip absolute noise
+    if has("wolfram language code:"):
+        text = _CODE_RE.sub("", text)
+    if "|" in text and has("alpha website result"):
+        text = _SITE_RE.sub("", text)
+
+    # 2. Focus on core content
+    start = text.find(FOCUS_MARKER)
+    if start > 0:
+        text = text[start:]
+
+    # 3. Result capture
+    if has("result:"):
+        text = _RESULT_RE.sub(r"**Result:** `\1`", text)
+
+    # 4. Clean up metadata URLs but keep text
+    if "://" in text:
+        if has("plot:") or has("image:") or has("url:"):
+            text = _LABEL_URL_RE.sub("", text)
+        text = _URL_RE.sub("", text)
+
+    # 5. Bold table headers
+    if "|" in text:
+        text = _HEADER_RE.sub(r"**\1** | \2", text)
+
+    # 6. Collapse gaps
+    text = _GAP_RE.sub("\n", text).strip()
+
+    # A URL at the end of a result takes its closing backtick with it, hence the search rather than a slice
+    marker = text.find("**Result:**")
+    match = _EXPR_RE.search(text, marker) if marker != -1 else None
+    return text, match.group(1) if match else None
+
+
+def extract_result(formatted: str) -> Optional[str]:
+    """Result expression from already formatted text (cache entries written before expressions were stored)."""
+    match = _EXPR_RE.search(formatted)
+    return match.group(1) if match else None